@@ -1,55 +1,67 @@
 import os
 from functools import wraps
-from typing import Callable, Coroutine, Any
+from typing import Callable, Coroutine, Any, List, Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 
+import callback_data
 import list_db
+import metrics
+from admin_views import (
+    events_page,
+    export_events,
+    export_subscribers,
+    export_users,
+    send_csv,
+    subscribers_page,
+    users_page,
+)
+from broadcast_jobs import broadcasts, format_job
+from callback_handlers import router
+from message_state import message_state
 
 ADMIN_ID: int = int(os.getenv("ADMIN_ID", "0"))
 
 
 # ── decorator ──────────────────────────────────────────────────────────────────
 
-def admin_only(
-    func: Callable[[Update, ContextTypes.DEFAULT_TYPE], Coroutine[Any, Any, None]]
-) -> Callable[[Update, ContextTypes.DEFAULT_TYPE], Coroutine[Any, Any, None]]:
+def admin_only(func: Callable[..., Coroutine[Any, Any, None]]) -> Callable[..., Coroutine[Any, Any, None]]:
     @wraps(func)
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: int) -> None:
         if update.effective_user.id != ADMIN_ID:
-            await update.message.reply_text("⛔ Access denied.")
+            # Callback queries are already answered by the router; just ignore them.
+            if update.callback_query is None:
+                await update.message.reply_text("⛔ Access denied.")
             return
-        await func(update, context)
+        await func(update, context, *args)
     return wrapper
 
 
+def _wants_csv(args: Optional[List[str]]) -> bool:
+    return bool(args) and args[0].lower() == "csv"
+
+
 # ── admin commands ─────────────────────────────────────────────────────────────
 
 @admin_only
 async def cmd_list_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """List all available events with subscriber count."""
-    if not list_db.events:
-        await update.message.reply_text("No events configured.")
+    """List events with subscriber counts, one page at a time. Usage: /list_events [csv]"""
+    if _wants_csv(context.args):
+        await send_csv(update.message, "events.csv", export_events)
         return
-    lines = [f"📋 *Events ({len(list_db.events)}):*"]
-    for e in list_db.events:
-        lines.append(
-            f"• `{e.id}` — *{e.name}*  |  👥 {len(e.subscriber_telegram_ids)} subscriber(s)"
-        )
-    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+    text, markup = events_page()
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=markup)
 
 
 @admin_only
 async def cmd_list_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """List all registered users."""
-    if not list_db.users:
-        await update.message.reply_text("No users registered yet.")
+    """List registered users, one page at a time. Usage: /list_users [csv]"""
+    if _wants_csv(context.args):
+        await send_csv(update.message, "users.csv", export_users)
         return
-    lines = [f"👥 *Users ({len(list_db.users)}):*"]
-    for u in list_db.users:
-        lines.append(f"• ID={u.id}  TG={u.telegram_id}")
-    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+    text, markup = users_page()
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=markup)
 
 
 @admin_only
@@ -59,33 +71,121 @@ async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("Usage: /broadcast <message>")
         return
     text = " ".join(context.args)
-    sent = 0
-    for user in list_db.users:
-        try:
-            await context.bot.send_message(user.telegram_id, f"📢 *Broadcast:*\n{text}", parse_mode="Markdown")
-            sent += 1
-        except Exception:
-            pass
-    await update.message.reply_text(f"✅ Broadcast sent to {sent} user(s).")
+    job = await broadcasts.start(context.bot, f"📢 *Broadcast:*\n{text}")
+    await update.message.reply_text(
+        f"🚀 Broadcast #{job.id} started for {job.total} user(s).\n"
+        f"Check it with /broadcast\\_status {job.id}",
+        parse_mode="Markdown",
+    )
+
+
+@admin_only
+async def cmd_broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show progress of a broadcast job. Usage: /broadcast_status <job_id>"""
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /broadcast_status <job_id>")
+        return
+    job = broadcasts.get(int(context.args[0]))
+    if job is None:
+        await update.message.reply_text(f"❌ Broadcast `{context.args[0]}` not found.", parse_mode="Markdown")
+        return
+    await update.message.reply_text(format_job(job), parse_mode="Markdown")
+
+
+@admin_only
+async def cmd_broadcast_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancel a running broadcast job. Usage: /broadcast_cancel <job_id>"""
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /broadcast_cancel <job_id>")
+        return
+    job_id = int(context.args[0])
+    if await broadcasts.cancel(job_id):
+        await update.message.reply_text(f"🛑 Broadcast #{job_id} cancelled.")
+    else:
+        await update.message.reply_text(f"ℹ️ Broadcast #{job_id} is not running.")
 
 
 @admin_only
 async def cmd_event_subscribers(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Show subscribers for a specific event. Usage: /event_subs <event_id>"""
+    """Show subscribers for a specific event. Usage: /event_subs <event_id> [csv]"""
     if not context.args:
-        await update.message.reply_text("Usage: /event_subs <event_id>")
+        await update.message.reply_text("Usage: /event_subs <event_id> [csv]")
         return
     event_id = context.args[0]
-    for event in list_db.events:
-        if event.id == event_id:
-            subs = event.subscriber_telegram_ids
-            if not subs:
-                await update.message.reply_text(f"No subscribers for *{event.name}*.", parse_mode="Markdown")
-            else:
-                lines = [f"👥 Subscribers for *{event.name}*:"] + [f"• `{tid}`" for tid in subs]
-                await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
-            return
-    await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+    event = list_db.get_event(event_id)
+    if event is None:
+        await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+        return
+    if _wants_csv(context.args[1:]):
+        await send_csv(
+            update.message, f"event_{event.id}_subscribers.csv", lambda path: export_subscribers(path, event.id)
+        )
+        return
+    text, markup = subscribers_page(event.id)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=markup)
+
+
+# ── listing pages ──────────────────────────────────────────────────────────────
+
+@router.route(callback_data.ADMIN_USERS_PAGE, arity=1)
+@admin_only
+async def on_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE, after: int) -> None:
+    text, markup = users_page(after)
+    await message_state.edit(update.callback_query, text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.route(callback_data.ADMIN_EVENTS_PAGE, arity=1)
+@admin_only
+async def on_events_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int) -> None:
+    text, markup = events_page(offset)
+    await message_state.edit(update.callback_query, text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.route(callback_data.ADMIN_SUBSCRIBERS_PAGE, arity=2)
+@admin_only
+async def on_subscribers_page(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int, offset: int
+) -> None:
+    text, markup = subscribers_page(event_id, offset)
+    await message_state.edit(update.callback_query, text, parse_mode="Markdown", reply_markup=markup)
+
+
+def _seconds(value: Optional[float]) -> str:
+    return "—" if value is None else f"≤{value:g}s"
+
+
+def _gauge(name: str) -> str:
+    gauge = metrics.registry.get(name)
+    return "—" if gauge is None else f"{gauge.get():g}"
+
+
+@admin_only
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Summary of the runtime metrics (the full set is on the /metrics endpoint)."""
+    sends = metrics.SENDS
+    fanout = metrics.FANOUT_SECONDS
+    lag = metrics.FIRE_LAG_SECONDS
+    lines = [
+        "📊 *Stats*",
+        f"👥 Users: {len(list_db.users)}  |  📋 Events: {len(list_db.events)}  |  "
+        f"🔔 Subscriptions: {list_db.subscriptions.count()}",
+        f"✉️ Sends: {sends.get('sent'):g} ok, {sends.get('failed'):g} failed, "
+        f"{sends.get('retried'):g} retried, {sends.get('rate_limited'):g} rate-limited",
+        f"📤 Fan-outs: {fanout.count()}  |  p50 {_seconds(fanout.quantile(0.5))}  "
+        f"p99 {_seconds(fanout.quantile(0.99))}",
+        f"⏰ Fire lag: {lag.count()} fire(s)  |  p50 {_seconds(lag.quantile(0.5))}  "
+        f"p99 {_seconds(lag.quantile(0.99))}",
+        f"🚫 Inactive users: {list_db.subscriptions.inactive_count()}  |  "
+        f"sends saved: {metrics.SENDS_SKIPPED.get():g}  |  newly blocked: {metrics.DEACTIVATIONS.get():g}",
+        f"📥 Queues: write-behind {_gauge('ntfly_write_behind_depth')}, "
+        f"outbox {_gauge('ntfly_outbox_active')}, updates {_gauge('ntfly_update_queue_depth')}",
+    ]
+    callbacks = metrics.CALLBACK_SECONDS
+    for (action,) in callbacks.label_sets():
+        lines.append(
+            f"🖱 `{action}`: {callbacks.count(action)} × p99 {_seconds(callbacks.quantile(0.99, action))}"
+        )
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 
 # ── handler factory ────────────────────────────────────────────────────────────
@@ -95,5 +195,8 @@ def get_admin_handlers() -> list:
         CommandHandler("list_events", cmd_list_events),
         CommandHandler("list_users", cmd_list_users),
         CommandHandler("broadcast", cmd_broadcast),
+        CommandHandler("broadcast_status", cmd_broadcast_status),
+        CommandHandler("broadcast_cancel", cmd_broadcast_cancel),
         CommandHandler("event_subs", cmd_event_subscribers),
+        CommandHandler("stats", cmd_stats),
     ]
@@ -0,0 +1,158 @@
+import asyncio
+import csv
+import os
+import tempfile
+from typing import Awaitable, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+import list_db
+from callback_data import ADMIN_EVENTS_PAGE, ADMIN_SUBSCRIBERS_PAGE, ADMIN_USERS_PAGE, encode
+
+# Sized so a full page stays well under Telegram's 4096-character message limit.
+USERS_PAGE_SIZE = 50
+EVENTS_PAGE_SIZE = 25
+SUBSCRIBERS_PAGE_SIZE = 100
+_NAME_LIMIT = 64
+
+# Rows written between yields to the event loop during an export.
+EXPORT_CHUNK = 5000
+
+Page = Tuple[str, Optional[InlineKeyboardMarkup]]
+Row = Sequence[object]
+
+
+def _clip(name: str) -> str:
+    return name if len(name) <= _NAME_LIMIT else name[:_NAME_LIMIT - 1] + "…"
+
+
+def _nav(
+    action: str, prefix: Tuple[int, ...], prev: Optional[int], nxt: Optional[int]
+) -> Optional[InlineKeyboardMarkup]:
+    row: List[InlineKeyboardButton] = []
+    if prev is not None:
+        row.append(InlineKeyboardButton("⬅️ Prev", callback_data=encode(action, *prefix, prev)))
+    if nxt is not None:
+        row.append(InlineKeyboardButton("➡️ Next", callback_data=encode(action, *prefix, nxt)))
+    return InlineKeyboardMarkup([row]) if row else None
+
+
+def _offsets(offset: int, size: int, total: int) -> Tuple[Optional[int], Optional[int]]:
+    prev = max(0, offset - size) if offset > 0 else None
+    nxt = offset + size if offset + size < total else None
+    return prev, nxt
+
+
+# ── pages ──────────────────────────────────────────────────────────────────────
+
+
+def users_page(after: int = 0) -> Page:
+    """Users with ``id > after``; ids are dense, so *after* doubles as the offset."""
+    total = len(list_db.users)
+    if not total:
+        return "No users registered yet.", None
+    page = list_db.users_after(after, USERS_PAGE_SIZE)
+    lines = [f"👥 *Users {after + 1}–{after + len(page)} of {total}:*"]
+    for u in page:
+        subs = len(list_db.subscriptions.events_of(u.telegram_id))
+        lines.append(f"• ID={u.id}  TG={u.telegram_id}  |  🔔 {subs}")
+    return "\n".join(lines), _nav(ADMIN_USERS_PAGE, (), *_offsets(after, USERS_PAGE_SIZE, total))
+
+
+def events_page(offset: int = 0) -> Page:
+    total = len(list_db.events)
+    if not total:
+        return "No events configured.", None
+    page = list_db.events[offset:offset + EVENTS_PAGE_SIZE]
+    lines = [f"📋 *Events {offset + 1}–{offset + len(page)} of {total}:*"]
+    for e in page:
+        lines.append(
+            f"• `{e.id}` — *{_clip(e.name)}*  |  👥 {list_db.subscriptions.subscriber_count(e.id)} subscriber(s)"
+        )
+    return "\n".join(lines), _nav(ADMIN_EVENTS_PAGE, (), *_offsets(offset, EVENTS_PAGE_SIZE, total))
+
+
+def subscribers_page(event_id: int, offset: int = 0) -> Page:
+    event = list_db.get_event(event_id)
+    if event is None:
+        return f"❌ Event `{event_id}` not found.", None
+    total = list_db.subscriptions.subscriber_count(event.id)
+    if not total:
+        return f"No subscribers for *{_clip(event.name)}*.", None
+    page = list_db.subscriptions.subscribers_page(event.id, offset, SUBSCRIBERS_PAGE_SIZE)
+    lines = [f"👥 Subscribers for *{_clip(event.name)}* ({offset + 1}–{offset + len(page)} of {total}):"]
+    lines += [f"• `{tid}`" for tid in page]
+    return "\n".join(lines), _nav(
+        ADMIN_SUBSCRIBERS_PAGE, (event.id,), *_offsets(offset, SUBSCRIBERS_PAGE_SIZE, total)
+    )
+
+
+# ── CSV export ─────────────────────────────────────────────────────────────────
+
+
+def _chunks(rows: Sequence[Row]) -> Iterator[Sequence[Row]]:
+    for start in range(0, len(rows), EXPORT_CHUNK):
+        yield rows[start:start + EXPORT_CHUNK]
+
+
+def _user_rows() -> Iterator[List[Row]]:
+    # Keyset walk: users are only ever appended, so this is safe across awaits.
+    after = 0
+    while True:
+        page = list_db.users_after(after, EXPORT_CHUNK)
+        if not page:
+            return
+        yield [(u.id, u.telegram_id, len(list_db.subscriptions.events_of(u.telegram_id))) for u in page]
+        after = page[-1].id
+
+
+def _event_rows() -> Iterator[List[Row]]:
+    for chunk in _chunks(list(list_db.events)):
+        yield [
+            (e.id, e.name, e.from_date.isoformat(), e.till_date.isoformat(),
+             list_db.subscriptions.subscriber_count(e.id))
+            for e in chunk
+        ]
+
+
+def _subscriber_rows(event_id: int) -> Iterator[List[Row]]:
+    # A snapshot of ids only (8 bytes each); the live set can't be iterated across awaits.
+    for chunk in _chunks(list_db.subscriptions.subscribers(event_id)):
+        yield [(tid,) for tid in chunk]
+
+
+async def write_csv(path: str, header: Row, chunks: Iterator[Sequence[Row]]) -> int:
+    """Write *chunks* of rows to *path*, yielding to the event loop between chunks. Returns the row count."""
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+            await asyncio.sleep(0)
+    return rows
+
+
+def export_users(path: str) -> Awaitable[int]:
+    return write_csv(path, ("id", "telegram_id", "subscriptions"), _user_rows())
+
+
+def export_events(path: str) -> Awaitable[int]:
+    return write_csv(path, ("id", "name", "from_date", "till_date", "subscribers"), _event_rows())
+
+
+def export_subscribers(path: str, event_id: int) -> Awaitable[int]:
+    return write_csv(path, ("telegram_id",), _subscriber_rows(event_id))
+
+
+async def send_csv(message: Message, filename: str, export: Callable[[str], Awaitable[int]]) -> None:
+    """Run *export* into a temporary file and reply to *message* with it as a document."""
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        rows = await export(path)
+        with open(path, "rb") as f:
+            await message.reply_document(f, filename=filename, caption=f"📄 {rows} row(s)")
+    finally:
+        os.unlink(path)
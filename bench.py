@@ -0,0 +1,386 @@
+"""
+Offline microbenchmarks for the bot's pure-Python hot paths.
+
+Builds a synthetic catalog and user base in memory (no Telegram, no disk),
+times each hot path and prints one JSON document, so runs from different
+commits can be diffed:
+
+    python bench.py --users 1000000 --events 10000 --out bench.json
+
+Subscriptions follow a Zipf-like popularity curve: a few events are followed
+by a large share of users, most by a handful. Users follow a geometric number
+of events (mean --subs-per-user).
+
+With --memory the user registry and subscription index are rebuilt under
+tracemalloc, and the bytes they hold per user and per subscription are
+reported under "memory": "after" for the packed layout in use, "before" for
+the layout it replaced (a list of User dataclasses plus sets of ids both ways).
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from types import SimpleNamespace
+from typing import Any, Callable, Coroutine, Dict, Iterator, List, Set, Tuple
+
+from telegram import CallbackQuery, Chat, Message, Update
+from telegram import User as TgUser
+
+import callback_data
+import list_db
+from callback_handlers import callback_handler
+from keyboard_cache import available_page, keyboard_cache, subscribe_markup
+from keyboards import get_subscribe_keyboard
+from models import Event, TimeSlot, User, WeekSchedule
+from occurrences import OccurrenceIndex
+from payloads import PayloadCache
+from time_trigger import APSchedulerTimeTrigger
+from time_trigger_heap import HeapTimeTrigger
+from user_interactions import get_available_events, get_or_create_user, get_subscribed_events
+
+_DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Synthetic telegram ids start here, so they look like real ones and never collide with 0.
+_TID_BASE = 100_000_000
+
+
+# ── synthetic data ─────────────────────────────────────────────────────────────
+
+
+def make_event(event_id: int, rng: random.Random) -> Event:
+    def week() -> WeekSchedule:
+        slots: Dict[str, List[TimeSlot]] = {}
+        for day in rng.sample(_DAYS, rng.randint(1, 3)):
+            slots[day] = [
+                TimeSlot(
+                    time=f"{rng.randint(7, 20):02d}:{rng.choice((0, 15, 30, 45)):02d}",
+                    description=f"*Lecture {event_id}*\nLink: https://example.com/{event_id}",
+                )
+            ]
+        return WeekSchedule(**slots)
+
+    today = date.today()
+    return Event(
+        id=event_id,
+        name=f"Event {event_id}",
+        description=f"Synthetic event {event_id}",
+        from_date=today - timedelta(days=30),
+        till_date=today + timedelta(days=300),
+        top_week=week(),
+        bottom_week=week(),
+    )
+
+
+def subscription_pairs(users: int, subs_per_user: float, rng: random.Random) -> Iterator[Tuple[int, int]]:
+    """``(event_id, telegram_id)`` pairs over the current catalog; may repeat a pair."""
+    event_ids = [e.id for e in list_db.events]
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(event_ids) + 1)))
+    p = 1.0 / subs_per_user
+    for i in range(users):
+        k = 1
+        while rng.random() > p and k < len(event_ids):
+            k += 1
+        for event_id in rng.choices(event_ids, cum_weights=cum_weights, k=k):
+            yield event_id, _TID_BASE + i
+
+
+def fill_users(users: int, subs_per_user: float, rng: random.Random) -> None:
+    list_db.users.load(User(id=i + 1, telegram_id=_TID_BASE + i) for i in range(users))
+    list_db.subscriptions.load(subscription_pairs(users, subs_per_user, rng))
+
+
+def populate(users: int, events: int, subs_per_user: float, seed: int) -> int:
+    """Fill ``list_db`` directly (bypassing write-behind). Returns the subscription count."""
+    rng = random.Random(seed)
+    list_db.set_events([make_event(i, rng) for i in range(1, events + 1)])
+    fill_users(users, subs_per_user, rng)
+    return list_db.subscriptions.count()
+
+
+def random_tid(rng: random.Random) -> int:
+    return _TID_BASE + rng.randrange(len(list_db.users))
+
+
+# ── fake Telegram objects ──────────────────────────────────────────────────────
+
+
+class FakeBot:
+    """Just enough of ``telegram.Bot`` for the callback handlers; never touches the network."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self._message_id = 0
+
+    async def answer_callback_query(self, *args: Any, **kwargs: Any) -> bool:
+        self.calls += 1
+        return True
+
+    async def edit_message_text(self, *args: Any, **kwargs: Any) -> bool:
+        self.calls += 1
+        return True
+
+    async def delete_message(self, *args: Any, **kwargs: Any) -> bool:
+        self.calls += 1
+        return True
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> Message:
+        self.calls += 1
+        self._message_id += 1
+        return Message(self._message_id, datetime.now(), Chat(chat_id, Chat.PRIVATE), text=text)
+
+
+def fake_callback(bot: FakeBot, telegram_id: int, data: str, message_id: int = 1) -> Update:
+    user = TgUser(telegram_id, "Bench", is_bot=False)
+    message = Message(message_id, datetime.now(), Chat(telegram_id, Chat.PRIVATE), text="…")
+    query = CallbackQuery("1", user, "bench", message=message, data=data)
+    query.set_bot(bot)
+    message.set_bot(bot)
+    return Update(1, callback_query=query)
+
+
+# ── timing ─────────────────────────────────────────────────────────────────────
+
+
+def _result(n: int, elapsed: float) -> Dict[str, float]:
+    return {
+        "n": n,
+        "total_s": round(elapsed, 6),
+        "per_op_us": round(elapsed / n * 1e6, 3),
+        "ops_per_s": round(n / elapsed, 1) if elapsed else float("inf"),
+    }
+
+
+def bench(n: int, func: Callable[[int], Any]) -> Dict[str, float]:
+    """Time *n* calls of ``func(i)``."""
+    started = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return _result(n, time.perf_counter() - started)
+
+
+async def abench(n: int, func: Callable[[int], Coroutine[Any, Any, Any]]) -> Dict[str, float]:
+    started = time.perf_counter()
+    for i in range(n):
+        await func(i)
+    return _result(n, time.perf_counter() - started)
+
+
+# ── suites ─────────────────────────────────────────────────────────────────────
+
+
+def bench_lookups(n: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    tids = [random_tid(rng) for _ in range(n)]
+    new_tids = [_TID_BASE - 1 - i for i in range(n)]
+    results = {
+        "get_or_create_user.existing": bench(n, lambda i: get_or_create_user(tids[i])),
+        "get_subscribed_events": bench(n, lambda i: get_subscribed_events(tids[i])),
+        "get_available_events": bench(n, lambda i: get_available_events(tids[i])),
+        "get_or_create_user.new": bench(n, lambda i: get_or_create_user(new_tids[i])),
+    }
+    # Drop the users (and queued writes) the last benchmark created.
+    list_db.users.truncate(len(list_db.users) - n)
+    list_db.write_behind._buffer.clear()
+    return results
+
+
+def bench_keyboards(n: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    tids = [random_tid(rng) for _ in range(n)]
+    cursors = [rng.randrange(max(1, len(list_db.events) - 10)) for _ in range(n)]
+
+    def uncached(i: int) -> None:
+        events, prev_cursor, next_cursor = available_page(tids[i], cursors[i])
+        get_subscribe_keyboard(events, prev_cursor, next_cursor)
+
+    keyboard_cache._entries.clear()
+    keyboard_cache._bytes = 0
+    cold = bench(n, lambda i: subscribe_markup(tids[i], cursors[i]))
+    warm = bench(n, lambda i: subscribe_markup(tids[i], cursors[i]))
+    return {
+        "subscribe_keyboard.page": bench(n, uncached),
+        "subscribe_markup.cold": cold,
+        "subscribe_markup.warm": warm,
+    }
+
+
+async def bench_callbacks(n: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    bot = FakeBot()
+    context = SimpleNamespace(bot=bot)
+    flows = {
+        "menu": lambda: callback_data.encode(callback_data.MENU),
+        "subscribe_start": lambda: callback_data.encode(callback_data.SUBSCRIBE_START),
+        "subscribe_page": lambda: callback_data.encode(
+            callback_data.SUBSCRIBE_PAGE, rng.randrange(len(list_db.events))
+        ),
+        "subscribe": lambda: callback_data.encode(
+            callback_data.SUBSCRIBE, rng.randrange(1, len(list_db.events) + 1)
+        ),
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for name, data in flows.items():
+        updates = [fake_callback(bot, random_tid(rng), data(), message_id=i) for i in range(n)]
+        results[f"callback_handler.{name}"] = await abench(
+            n, lambda i: callback_handler(updates[i], context)
+        )
+    list_db.write_behind._buffer.clear()
+    return results
+
+
+async def bench_triggers(rng: random.Random) -> Dict[str, Dict[str, float]]:
+    async def noop(event: Event, slot: TimeSlot, at: datetime) -> None:
+        pass
+
+    events = list(list_db.events)
+    removals = rng.sample(events, min(1000, len(events)))
+    results: Dict[str, Dict[str, float]] = {}
+    for name, trigger in (
+        ("apscheduler", APSchedulerTimeTrigger(OccurrenceIndex(), PayloadCache())),
+        ("heap", HeapTimeTrigger(OccurrenceIndex(), PayloadCache())),
+    ):
+        trigger.start()
+        started = time.perf_counter()
+        await trigger.import_triggers(events, noop)
+        results[f"{name}.import_triggers"] = _result(len(events), time.perf_counter() - started)
+        results[f"{name}.remove_trigger"] = await abench(
+            len(removals), lambda i: trigger.remove_trigger(removals[i].id)
+        )
+        await trigger.remove_all_triggers()
+        if name == "apscheduler":
+            trigger._scheduler.shutdown(wait=False)
+    return results
+
+
+@dataclass
+class _UnpackedUser:
+    """``models.User`` as it was before it got ``__slots__``."""
+
+    id: int
+    telegram_id: int
+
+
+def _unpacked(users: int, pairs: List[Tuple[int, int]]) -> Tuple[Any, ...]:
+    """The layout the registry and index replaced: a list of users, sets of ids both ways, versions."""
+    registry = [_UnpackedUser(id=i + 1, telegram_id=_TID_BASE + i) for i in range(users)]
+    by_event: Dict[int, Set[int]] = {}
+    by_user: Dict[int, Set[int]] = {}
+    versions: Dict[int, int] = {}
+    for event_id, telegram_id in pairs:
+        by_event.setdefault(event_id, set()).add(telegram_id)
+        by_user.setdefault(telegram_id, set()).add(event_id)
+        versions[telegram_id] = versions.get(telegram_id, 0) + 1
+    return registry, by_event, by_user, versions
+
+
+def _traced(build: Callable[[], Any]) -> Tuple[int, int]:
+    """Bytes held by what *build* returns or stores, and the peak while building it."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return held, peak
+
+
+def bench_memory(users: int, subs_per_user: float, seed: int) -> Dict[str, Dict[str, float]]:
+    """Build the users and subscriptions in the old and the packed layout under tracemalloc."""
+    rng = random.Random(seed)
+    # Replay the catalog's draws so the subscriptions match the timed run.
+    for i in range(1, len(list_db.events) + 1):
+        make_event(i, rng)
+    pairs = list(subscription_pairs(users, subs_per_user, rng))
+    list_db.users.load([])
+    list_db.subscriptions.load([])
+
+    def packed() -> None:
+        list_db.users.load(User(id=i + 1, telegram_id=_TID_BASE + i) for i in range(users))
+        list_db.subscriptions.load(pairs)
+
+    subscriptions = len(set(pairs))
+    report: Dict[str, Dict[str, float]] = {}
+    for name, build in (("before", lambda: _unpacked(users, pairs)), ("after", packed)):
+        held, peak = _traced(build)
+        report[name] = {
+            "held_bytes": held,
+            "peak_bytes": peak,
+            "bytes_per_user": round(held / users, 1),
+            "bytes_per_subscription": round(held / subscriptions, 1) if subscriptions else 0.0,
+        }
+    return report
+
+
+# ── entry point ────────────────────────────────────────────────────────────────
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    subscriptions = populate(args.users, args.events, args.subs_per_user, args.seed)
+    setup = time.perf_counter() - started
+
+    results: Dict[str, Dict[str, float]] = {}
+    results.update(bench_lookups(args.n, rng))
+    results.update(bench_keyboards(args.n, rng))
+    results.update(await bench_callbacks(args.n, rng))
+    results.update(await bench_triggers(rng))
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "users": args.users,
+            "events": args.events,
+            "subscriptions": subscriptions,
+            "seed": args.seed,
+            "setup_s": round(setup, 3),
+        },
+        "results": results,
+    }
+    if args.memory:
+        report["memory"] = bench_memory(args.users, args.subs_per_user, args.seed)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--subs-per-user", type=float, default=3.0)
+    parser.add_argument("-n", type=int, default=200, help="calls per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="also measure bytes per user")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from dataclasses import astuple
+from typing import Dict, Optional, Set
+
+from telegram import Bot
+
+import list_db
+from delivery import Sender
+from di import sender, storage, write_behind
+from metrics import SENDS_SKIPPED
+from models import BroadcastJob
+from storage_abs import StorageAbs
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastManager:
+    """Runs /broadcast fan-outs as background jobs.
+
+    Users are walked in ``User.id`` order in chunks of *chunk_size*. Every
+    successful send is recorded through the write-behind *queue*, and after
+    each chunk the job's cursor (last user id handled) replaces those records.
+    A job interrupted by a restart resumes from its cursor and skips the users
+    recorded past it, so at most the last unflushed sends are repeated.
+
+    Only :meth:`start` writes straight to storage; every later save of a job
+    goes through the queue too, keeping it ordered after the job's sends.
+    """
+
+    def __init__(
+        self,
+        engine: Sender,
+        store: StorageAbs,
+        queue: WriteBehindQueue,
+        chunk_size: int = 200,
+    ) -> None:
+        self._engine = engine
+        self._store = store
+        self._queue = queue
+        self._chunk_size = chunk_size
+        self._jobs: Dict[int, BroadcastJob] = {}
+        self._delivered: Dict[int, Set[int]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = False
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    def _checkpoint(self, job: BroadcastJob) -> None:
+        self._queue.put("save_broadcast", *astuple(job))
+        self._queue.put("broadcast_clear", job.id)
+
+    def _spawn(self, bot: Bot, job: BroadcastJob) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(bot, job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    async def _run(self, bot: Bot, job: BroadcastJob) -> None:
+        delivered = self._delivered.pop(job.id, set())
+        while job.status == "running" and not self._stopping:
+            chunk = [
+                u for u in list_db.users_after(job.cursor, self._chunk_size)
+                if u.id <= job.target_user_id
+            ]
+            if not chunk:
+                job.status = "done"
+                job.finished_at = time.time()
+                break
+            recipients = [u.telegram_id for u in chunk if list_db.subscriptions.is_active(u.telegram_id)]
+            SENDS_SKIPPED.inc(amount=len(chunk) - len(recipients))
+            if delivered:
+                # Reached before the restart; count them, don't send again.
+                job.sent += sum(tid in delivered for tid in recipients)
+                recipients = [tid for tid in recipients if tid not in delivered]
+            stats = await self._engine.deliver(
+                bot,
+                recipients,
+                job.text,
+                on_sent=lambda tid: self._queue.put("broadcast_delivered", job.id, tid),
+                parse_mode="Markdown",
+            )
+            list_db.deactivate(stats.unreachable)
+            job.sent += stats.sent
+            job.failed += stats.failed
+            job.cursor = chunk[-1].id
+            self._checkpoint(job)
+        self._checkpoint(job)
+        logger.info("Broadcast #%d %s: %d sent, %d failed.", job.id, job.status, job.sent, job.failed)
+
+    # ── public API ─────────────────────────────────────────────────────────────
+
+    async def load(self, bot: Bot) -> None:
+        """Load stored jobs and resume the unfinished ones. Called once in post_init."""
+        for job_id, telegram_id in await self._store.load_broadcast_delivered():
+            self._delivered.setdefault(job_id, set()).add(telegram_id)
+        for job in await self._store.load_broadcasts():
+            self._jobs[job.id] = job
+            if job.status == "running":
+                logger.info("Resuming broadcast #%d from user id %d.", job.id, job.cursor)
+                self._spawn(bot, job)
+
+    async def start(self, bot: Bot, text: str) -> BroadcastJob:
+        job = BroadcastJob(
+            id=max(self._jobs, default=0) + 1,
+            text=text,
+            target_user_id=len(list_db.users),
+            total=len(list_db.users),
+            started_at=time.time(),
+        )
+        self._jobs[job.id] = job
+        await self._store.apply([("save_broadcast", astuple(job))])
+        self._spawn(bot, job)
+        return job
+
+    def get(self, job_id: int) -> Optional[BroadcastJob]:
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: int) -> bool:
+        """Stop a running job for good. Returns ``False`` if it is not running."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status != "running":
+            return False
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            # Let its sends settle so their records queue before the checkpoint.
+            await asyncio.gather(task, return_exceptions=True)
+        self._checkpoint(job)
+        return True
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop all jobs after their current chunk, keeping them resumable by :meth:`load`."""
+        self._stopping = True
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def format_job(job: BroadcastJob) -> str:
+    # User ids are dense, so the cursor is the number of users handled so far.
+    done = min(job.cursor, job.total)
+    percent = 100 * done / job.total if job.total else 100.0
+    elapsed = (job.finished_at or time.time()) - job.started_at
+    rate = (job.sent + job.failed) / elapsed if elapsed > 0 else 0.0
+    skipped = max(0, done - job.sent - job.failed)
+    return (
+        f"📢 *Broadcast #{job.id}* — {job.status}\n"
+        f"Progress: {done}/{job.total} ({percent:.0f}%)\n"
+        f"Sent: {job.sent}  |  Failed: {job.failed}  |  Skipped (inactive): {skipped}\n"
+        f"Throughput: {rate:.1f} msg/s"
+    )
+
+
+broadcasts = BroadcastManager(sender, storage, write_behind)
@@ -0,0 +1,77 @@
+"""
+Compact ``callback_data`` encoding.
+
+Every button carries ``<action>[:<arg>...]`` where *action* is one of the
+short codes below and integer arguments are written in base 36. Telegram
+caps callback_data at 64 bytes; :func:`encode` refuses anything longer.
+"""
+
+from typing import Dict, Tuple
+
+MAX_BYTES = 64
+SEPARATOR = ":"
+
+MENU = "m"
+SUBSCRIBE_START = "ss"
+SUBSCRIBE_PAGE = "sp"
+SUBSCRIBE = "s"
+UNSUBSCRIBE_START = "us"
+UNSUBSCRIBE_PAGE = "up"
+UNSUBSCRIBE = "u"
+CANCEL_ALL = "ca"
+
+# Admin listings; the argument is the page's cursor (see admin_views).
+ADMIN_USERS_PAGE = "au"
+ADMIN_EVENTS_PAGE = "ae"
+ADMIN_SUBSCRIBERS_PAGE = "as"
+
+# Old page buttons carry a page number, not a cursor. Turning one into the
+# other depends on who clicks, so they decode to their own codes and the
+# handlers convert (see keyboard_cache.legacy_*_cursor).
+LEGACY_SUBSCRIBE_PAGE = "lsp"
+LEGACY_UNSUBSCRIBE_PAGE = "lup"
+
+# Verbose codes used by buttons sent before the compact encoding; their
+# integer arguments are decimal. Kept so old messages keep working.
+LEGACY_ACTIONS: Dict[str, str] = {
+    "menu": MENU,
+    "subscribe_start": SUBSCRIBE_START,
+    "subscribe_page": LEGACY_SUBSCRIBE_PAGE,
+    "do_subscribe": SUBSCRIBE,
+    "unsubscribe_start": UNSUBSCRIBE_START,
+    "unsubscribe_page": LEGACY_UNSUBSCRIBE_PAGE,
+    "do_unsubscribe": UNSUBSCRIBE,
+    "cancel_all": CANCEL_ALL,
+}
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(value: int) -> str:
+    if value < 0:
+        return "-" + _base36(-value)
+    out = ""
+    while True:
+        value, digit = divmod(value, 36)
+        out = _DIGITS[digit] + out
+        if not value:
+            return out
+
+
+def encode(action: str, *args: int) -> str:
+    data = SEPARATOR.join((action, *(_base36(a) for a in args)))
+    if len(data.encode()) > MAX_BYTES:
+        raise ValueError(f"callback_data exceeds {MAX_BYTES} bytes: {data!r}")
+    return data
+
+
+def decode(data: str) -> Tuple[str, Tuple[int, ...]]:
+    """Split *data* into its action code and integer arguments.
+
+    Raises ``ValueError`` for malformed arguments.
+    """
+    action, *raw = data.split(SEPARATOR)
+    legacy = LEGACY_ACTIONS.get(action)
+    if legacy is not None:
+        return legacy, tuple(int(a) for a in raw)
+    return action, tuple(int(a, 36) for a in raw)
@@ -1,119 +1,166 @@
-from telegram import Update
+import asyncio
+import logging
+
+from telegram import CallbackQuery, Update
+from telegram.error import TelegramError
 from telegram.ext import CallbackQueryHandler, ContextTypes
 
+import callback_data
 import list_db
-from keyboards import (
-    get_menu_keyboard,
-    get_subscribe_keyboard,
-    get_unsubscribe_keyboard,
-)
-from user_interactions import (
-    get_available_events,
-    get_or_create_user,
-    get_subscribed_events,
+from callback_router import CallbackRouter
+from delivery import retry_once
+from keyboard_cache import (
+    legacy_available_cursor,
+    legacy_subscribed_cursor,
+    subscribe_markup,
+    unsubscribe_markup,
 )
+from keyboards import get_menu_keyboard
+from message_state import message_state
+from user_interactions import get_or_create_user
+
+logger = logging.getLogger(__name__)
+
+router = CallbackRouter()
+
+SUBSCRIBE_TITLE = "📋 *Choose a subscription:*"
+UNSUBSCRIBE_TITLE = "🔕 *Choose a subscription to remove:*"
+
+
+async def _answer(query: CallbackQuery) -> None:
+    try:
+        await retry_once(query.answer)
+    except TelegramError as exc:
+        logger.warning("Could not answer callback query %s: %s", query.id, exc)
 
 
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    get_or_create_user(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
-    data: str = query.data
-    tid: int = update.effective_user.id
-    get_or_create_user(tid)
-
-    # ── Main menu ──────────────────────────────────────────────────────────────
-    if data == "menu":
-        has_subs = bool(get_subscribed_events(tid))
-        await query.edit_message_text(
-            "📋 *Main Menu*",
-            parse_mode="Markdown",
-            reply_markup=get_menu_keyboard(has_subs),
-        )
-
-    # ── Subscribe flow ─────────────────────────────────────────────────────────
-    elif data == "subscribe_start":
-        available = get_available_events(tid)
-        await query.delete_message()
-        if not available:
-            await context.bot.send_message(tid, "ℹ️ No new subscriptions available.")
-            return
-        await context.bot.send_message(
-            tid,
-            "📋 *Choose a subscription:*",
-            parse_mode="Markdown",
-            reply_markup=get_subscribe_keyboard(available, 0),
-        )
-
-    elif data.startswith("subscribe_page:"):
-        page = int(data.split(":")[1])
-        available = get_available_events(tid)
-        await query.edit_message_text(
-            "📋 *Choose a subscription:*",
-            parse_mode="Markdown",
-            reply_markup=get_subscribe_keyboard(available, page),
-        )
-
-    elif data.startswith("do_subscribe:"):
-        event_id = data.split(":")[1]
-        if event_id.isdigit():
-            event_id = int(event_id)
-            for event in list_db.events:
-                if event.id == event_id:
-                    if tid not in event.subscriber_telegram_ids:
-                        event.subscriber_telegram_ids.append(tid)
-                    await query.edit_message_text(
-                        f"✅ Subscribed to *{event.name}*!", parse_mode="Markdown"
-                    )
-                    return
-        await query.edit_message_text("❌ Event not found.")
-
-    # ── Unsubscribe flow ───────────────────────────────────────────────────────
-    elif data == "unsubscribe_start":
-        subs = get_subscribed_events(tid)
-        await query.delete_message()
-        if not subs:
-            await context.bot.send_message(tid, "ℹ️ You have no active subscriptions.")
-            return
-        await context.bot.send_message(
-            tid,
-            "🔕 *Choose a subscription to remove:*",
-            parse_mode="Markdown",
-            reply_markup=get_unsubscribe_keyboard(subs, 0),
-        )
-
-    elif data.startswith("unsubscribe_page:"):
-        page = int(data.split(":")[1])
-        subs = get_subscribed_events(tid)
-        await query.edit_message_text(
-            "🔕 *Choose a subscription to remove:*",
-            parse_mode="Markdown",
-            reply_markup=get_unsubscribe_keyboard(subs, page),
-        )
-
-    elif data.startswith("do_unsubscribe:"):
-        event_id = data.split(":")[1]
-        for event in list_db.events:
-            if event.id == event_id:
-                if tid in event.subscriber_telegram_ids:
-                    event.subscriber_telegram_ids.remove(tid)
-                await query.edit_message_text(
-                    f"✅ Unsubscribed from *{event.name}*!", parse_mode="Markdown"
-                )
-                return
-        await query.edit_message_text("❌ Event not found.")
-
-    # ── Cancel all ─────────────────────────────────────────────────────────────
-    elif data == "cancel_all":
-        count = 0
-        for event in list_db.events:
-            if tid in event.subscriber_telegram_ids:
-                event.subscriber_telegram_ids.remove(tid)
-                count += 1
-        await query.edit_message_text(
-            f"✅ Unsubscribed from all *{count}* notification(s).\n\n📋 *Main Menu*",
-            parse_mode="Markdown",
-            reply_markup=get_menu_keyboard(False),
-        )
+    # Answer in parallel with the edit instead of paying for it as a separate round trip.
+    # No error handler is registered: Telegram errors stop here, logged, not in the Application.
+    try:
+        await asyncio.gather(_answer(query), router.dispatch(update, context))
+    except TelegramError as exc:
+        logger.warning("Callback %r failed: %s", query.data, exc)
+
+
+# ── Main menu ──────────────────────────────────────────────────────────────────
+
+@router.route(callback_data.MENU)
+async def on_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    has_subs = bool(list_db.subscriptions.events_of(update.effective_user.id))
+    await message_state.edit(
+        update.callback_query,
+        "📋 *Main Menu*",
+        parse_mode="Markdown",
+        reply_markup=get_menu_keyboard(has_subs),
+    )
+
+
+# ── Subscribe flow ─────────────────────────────────────────────────────────────
+
+@router.route(callback_data.SUBSCRIBE_START)
+async def on_subscribe_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    tid = update.effective_user.id
+    markup = subscribe_markup(tid)
+    await retry_once(update.callback_query.delete_message)
+    message_state.forget(update.callback_query)
+    if markup is None:
+        await retry_once(lambda: context.bot.send_message(tid, "ℹ️ No new subscriptions available."))
+        return
+    message = await retry_once(lambda: context.bot.send_message(
+        tid,
+        SUBSCRIBE_TITLE,
+        parse_mode="Markdown",
+        reply_markup=markup,
+    ))
+    message_state.remember(message, SUBSCRIBE_TITLE, "Markdown", markup)
+
+
+@router.route(callback_data.SUBSCRIBE_PAGE, arity=1)
+async def on_subscribe_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor: int) -> None:
+    await message_state.edit(
+        update.callback_query,
+        SUBSCRIBE_TITLE,
+        parse_mode="Markdown",
+        reply_markup=subscribe_markup(update.effective_user.id, cursor),
+    )
+
+
+@router.route(callback_data.LEGACY_SUBSCRIBE_PAGE, arity=1)
+async def on_legacy_subscribe_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    await on_subscribe_page(update, context, legacy_available_cursor(update.effective_user.id, page))
+
+
+@router.route(callback_data.SUBSCRIBE, arity=1)
+async def on_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int) -> None:
+    query = update.callback_query
+    event = list_db.get_event(event_id)
+    if event is None:
+        await message_state.edit(query, "❌ Event not found.")
+        return
+    list_db.subscribe(event.id, update.effective_user.id)
+    await message_state.edit(query, f"✅ Subscribed to *{event.name}*!", parse_mode="Markdown")
+
+
+# ── Unsubscribe flow ───────────────────────────────────────────────────────────
+
+@router.route(callback_data.UNSUBSCRIBE_START)
+async def on_unsubscribe_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    tid = update.effective_user.id
+    markup = unsubscribe_markup(tid)
+    await retry_once(update.callback_query.delete_message)
+    message_state.forget(update.callback_query)
+    if markup is None:
+        await retry_once(lambda: context.bot.send_message(tid, "ℹ️ You have no active subscriptions."))
+        return
+    message = await retry_once(lambda: context.bot.send_message(
+        tid,
+        UNSUBSCRIBE_TITLE,
+        parse_mode="Markdown",
+        reply_markup=markup,
+    ))
+    message_state.remember(message, UNSUBSCRIBE_TITLE, "Markdown", markup)
+
+
+@router.route(callback_data.UNSUBSCRIBE_PAGE, arity=1)
+async def on_unsubscribe_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor: int) -> None:
+    await message_state.edit(
+        update.callback_query,
+        UNSUBSCRIBE_TITLE,
+        parse_mode="Markdown",
+        reply_markup=unsubscribe_markup(update.effective_user.id, cursor),
+    )
+
+
+@router.route(callback_data.LEGACY_UNSUBSCRIBE_PAGE, arity=1)
+async def on_legacy_unsubscribe_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    await on_unsubscribe_page(update, context, legacy_subscribed_cursor(page))
+
+
+@router.route(callback_data.UNSUBSCRIBE, arity=1)
+async def on_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int) -> None:
+    query = update.callback_query
+    event = list_db.get_event(event_id)
+    if event is None:
+        await message_state.edit(query, "❌ Event not found.")
+        return
+    list_db.unsubscribe(event.id, update.effective_user.id)
+    await message_state.edit(query, f"✅ Unsubscribed from *{event.name}*!", parse_mode="Markdown")
+
+
+# ── Cancel all ─────────────────────────────────────────────────────────────────
+
+@router.route(callback_data.CANCEL_ALL)
+async def on_cancel_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    count = len(list_db.unsubscribe_all(update.effective_user.id))
+    await message_state.edit(
+        update.callback_query,
+        f"✅ Unsubscribed from all *{count}* notification(s).\n\n📋 *Main Menu*",
+        parse_mode="Markdown",
+        reply_markup=get_menu_keyboard(False),
+    )
 
 
 def get_callback_handlers() -> list:
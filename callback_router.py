@@ -0,0 +1,50 @@
+import logging
+from typing import Any, Callable, Coroutine, Dict, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+import callback_data
+from metrics import CALLBACK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# A route handler receives the update, the context and the decoded arguments.
+CallbackAction = Callable[..., Coroutine[Any, Any, None]]
+
+
+class CallbackRouter:
+    """Table-driven dispatcher for inline-keyboard callbacks.
+
+    Handlers register under a :mod:`callback_data` action code together with
+    the number of integer arguments they expect. Dispatching decodes the data
+    once and jumps to the handler with a single dict lookup, however many
+    routes exist.
+    """
+
+    def __init__(self) -> None:
+        self._routes: Dict[str, Tuple[CallbackAction, int]] = {}
+
+    def route(self, action: str, arity: int = 0) -> Callable[[CallbackAction], CallbackAction]:
+        def register(func: CallbackAction) -> CallbackAction:
+            if action in self._routes:
+                raise ValueError(f"Duplicate callback route: {action!r}")
+            self._routes[action] = (func, arity)
+            return func
+        return register
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Run the handler for ``update.callback_query.data``. Returns ``False`` if none matched."""
+        data = update.callback_query.data or ""
+        try:
+            action, args = callback_data.decode(data)
+        except ValueError:
+            logger.warning("Malformed callback data %r", data)
+            return False
+        route = self._routes.get(action)
+        if route is None or len(args) != route[1]:
+            logger.warning("No route for callback data %r", data)
+            return False
+        with CALLBACK_SECONDS.time(action):
+            await route[0](update, context, *args)
+        return True
@@ -0,0 +1,75 @@
+import logging
+from datetime import datetime, timedelta
+from itertools import takewhile
+from typing import List, Optional, Tuple
+
+from telegram import Bot
+
+from di import payloads
+from models import Event
+from occurrences import Occurrence, expand
+from outbox import Outbox, batch_id
+from payloads import join
+
+logger = logging.getLogger(__name__)
+
+COALESCED_HEADER = "⏰ Missed while the bot was offline:\n\n"
+
+
+def missed_fires(
+    events: List[Event], since: datetime, now: datetime
+) -> List[Tuple[Event, List[Occurrence]]]:
+    """Occurrences in ``[since, now]`` each event's misfire policy still wants sent.
+
+    ``skip`` drops them all; ``grace`` and ``coalesce`` keep the ones at most
+    ``misfire_grace`` seconds old. *since* itself is included: fires sharing
+    that minute may not all have been committed before the bot stopped.
+    """
+    plan: List[Tuple[Event, List[Occurrence]]] = []
+    for event in events:
+        if event.misfire_policy == "skip":
+            continue
+        oldest = max(since, now - timedelta(seconds=event.misfire_grace))
+        # expand() starts strictly after its argument; slots are whole minutes.
+        candidates = takewhile(lambda o: o.at <= now, expand(event, oldest - timedelta(minutes=1)))
+        occurrences = [o for o in candidates if o.at >= oldest]
+        if occurrences:
+            plan.append((event, occurrences))
+    return plan
+
+
+async def catch_up(
+    bot: Bot, outbox: Outbox, events: List[Event], since: Optional[datetime], now: datetime
+) -> int:
+    """Send what was missed between the last recorded fire *since* and *now*.
+
+    Goes through the outbox like any scheduled fire, so it records the fire
+    time and is crash-safe itself; fires whose batch is already stored are
+    skipped. ``coalesce`` events get one message listing every missed slot
+    instead of one message each; the batch records each slot it covers, so a
+    later catch-up skips them too. Returns the number of batches sent.
+    """
+    if since is None:
+        # First run: nothing to catch up on, but start the clock.
+        await outbox.mark(now)
+        return 0
+
+    sent = 0
+    for event, occurrences in missed_fires(events, since, now):
+        occurrences = [
+            o for o in occurrences if not await outbox.seen(batch_id(event.id, o.slot, o.at.date()))
+        ]
+        if not occurrences:
+            continue
+        logger.info("Catching up %d missed fire(s) of event %s.", len(occurrences), event.id)
+        if event.misfire_policy == "coalesce" and len(occurrences) > 1:
+            last = occurrences[-1]
+            payload = join([payloads.get(event, o.slot) for o in occurrences], header=COALESCED_HEADER)
+            keys = [batch_id(event.id, o.slot, o.at.date()) for o in occurrences]
+            await outbox.send(bot, f"{keys[-1]}+{len(occurrences)}", event.id, payload, last.at, covers=keys)
+            sent += 1
+            continue
+        for o in occurrences:
+            await outbox.fire(bot, event, o.slot, o.at)
+            sent += 1
+    return sent
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Protocol, Tuple, TypeVar
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from metrics import SEND_SECONDS, observe_fanout
+from request_lanes import BULK, set_lane
+
+logger = logging.getLogger(__name__)
+
+# Called with the chat id of every successful send.
+OnSent = Callable[[int], None]
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Classic token bucket shared by every concurrent sender.
+
+    :meth:`pause` empties the bucket and blocks all acquirers, which is how a
+    Telegram ``RetryAfter`` is turned into a global back-off.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._tokens = self._capacity
+        self._updated = 0.0
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self._updated:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def pause(self, seconds: float) -> None:
+        now = asyncio.get_running_loop().time()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._blocked_until
+
+
+# BadRequest messages that mean the chat is gone, not that this message was wrong.
+_GONE_MESSAGES = ("chat not found", "user not found", "peer_id_invalid")
+
+
+def is_unreachable(exc: TelegramError) -> bool:
+    """Whether *exc* means no message will reach the chat until the user writes to the bot again."""
+    if isinstance(exc, Forbidden):
+        return True
+    return isinstance(exc, BadRequest) and any(m in exc.message.lower() for m in _GONE_MESSAGES)
+
+
+@dataclass
+class DeliveryStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    rate_limited: int = 0
+    duration: float = 0.0
+    # Chats that failed permanently (blocked, deleted); also counted in `failed`.
+    unreachable: List[int] = field(default_factory=list)
+
+    def merge(self, other: "DeliveryStats") -> None:
+        """Fold the stats of a parallel fan-out (e.g. another shard) into this one."""
+        self.total += other.total
+        self.sent += other.sent
+        self.failed += other.failed
+        self.retried += other.retried
+        self.rate_limited += other.rate_limited
+        self.duration = max(self.duration, other.duration)
+        self.unreachable.extend(other.unreachable)
+
+    def summary(self) -> str:
+        rate = self.sent / self.duration if self.duration else 0.0
+        return (
+            f"{self.sent}/{self.total} sent, {self.failed} failed ({len(self.unreachable)} unreachable), "
+            f"{self.retried} retried, {self.rate_limited} rate-limited in {self.duration:.1f}s ({rate:.1f} msg/s)"
+        )
+
+
+class Sender(Protocol):
+    """Anything that can fan one message out: the local engine or the shard coordinator."""
+
+    async def deliver(
+        self,
+        bot: Bot,
+        chat_ids: Iterable[int],
+        text: str,
+        on_sent: Optional[OnSent] = None,
+        observe: bool = True,
+        **send_kwargs: Any,
+    ) -> "DeliveryStats":
+        ...
+
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    delay = exc.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+
+async def retry_once(call: Callable[[], Awaitable[T]]) -> T:
+    """Await ``call()``; after a ``RetryAfter``, wait it out and try exactly once more.
+
+    For single interactive requests; fan-outs go through :class:`DeliveryEngine`.
+    """
+    try:
+        return await call()
+    except RetryAfter as exc:
+        await asyncio.sleep(retry_after_seconds(exc))
+    return await call()
+
+
+@dataclass
+class _Fanout:
+    queue: "asyncio.Queue[Tuple[int, int]]"
+    stats: DeliveryStats
+    pending: int
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    timers: List[asyncio.TimerHandle] = field(default_factory=list)
+
+
+class DeliveryEngine:
+    """Concurrent, rate-limited fan-out of one message to many chats.
+
+    * at most *concurrency* requests are in flight at once;
+    * a global :class:`TokenBucket` keeps the bot under Telegram's overall
+      limit (~30 msg/s), and each chat gets at most one message every
+      *per_chat_interval* seconds;
+    * ``RetryAfter`` pauses the global bucket for the requested time and
+      re-queues the chat without spending a retry;
+    * transient network errors are re-queued with exponential back-off up
+      to *max_attempts*; anything else counts as a failure;
+    * chats that blocked the bot or no longer exist are listed in
+      ``DeliveryStats.unreachable`` so the caller can stop sending to them;
+    * sends go out on the bulk lane (see :mod:`request_lanes`), so
+      user-facing calls are never queued behind them.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        concurrency: int = 16,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 3,
+        backoff: float = 1.0,
+    ) -> None:
+        self._bucket = TokenBucket(rate)
+        self._concurrency = concurrency
+        self._per_chat_interval = per_chat_interval
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._chat_ready: Dict[int, float] = {}
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        ready = self._chat_ready.get(chat_id, 0.0)
+        if ready > now:
+            await asyncio.sleep(ready - now)
+            now = loop.time()
+        self._chat_ready[chat_id] = now + self._per_chat_interval
+        if len(self._chat_ready) > 10_000:
+            self._chat_ready = {c: t for c, t in self._chat_ready.items() if t > now}
+
+    def _finish(self, fanout: _Fanout) -> None:
+        fanout.pending -= 1
+        if fanout.pending == 0:
+            fanout.done.set()
+
+    def _retry_later(self, fanout: _Fanout, delay: float, item: Tuple[int, int]) -> None:
+        loop = asyncio.get_running_loop()
+        fanout.timers.append(loop.call_later(delay, fanout.queue.put_nowait, item))
+
+    async def _worker(
+        self,
+        bot: Bot,
+        fanout: _Fanout,
+        text: str,
+        on_sent: Optional[OnSent],
+        send_kwargs: Dict[str, Any],
+    ) -> None:
+        set_lane(BULK)
+        stats = fanout.stats
+        while True:
+            chat_id, attempt = await fanout.queue.get()
+            await self._bucket.acquire()
+            await self._wait_for_chat(chat_id)
+            try:
+                with SEND_SECONDS.time():
+                    await bot.send_message(chat_id, text, **send_kwargs)
+            except RetryAfter as exc:
+                delay = retry_after_seconds(exc)
+                stats.rate_limited += 1
+                self._bucket.pause(delay)
+                self._retry_later(fanout, delay, (chat_id, attempt))
+                continue
+            except (BadRequest, Forbidden) as exc:
+                stats.failed += 1
+                if is_unreachable(exc):
+                    stats.unreachable.append(chat_id)
+                    logger.info("User %s is unreachable: %s", chat_id, exc)
+                else:
+                    logger.warning("Could not notify user %s: %s", chat_id, exc)
+            except NetworkError as exc:
+                if attempt + 1 < self._max_attempts:
+                    stats.retried += 1
+                    delay = self._backoff * 2 ** attempt * (1 + random.random())
+                    self._retry_later(fanout, delay, (chat_id, attempt + 1))
+                    continue
+                stats.failed += 1
+                logger.warning("Giving up on user %s after %d attempt(s): %s", chat_id, attempt + 1, exc)
+            except Exception as exc:
+                stats.failed += 1
+                logger.warning("Could not notify user %s: %s", chat_id, exc)
+            else:
+                stats.sent += 1
+                if on_sent is not None:
+                    try:
+                        on_sent(chat_id)
+                    except Exception:
+                        # Bookkeeping only; a dead worker would leave deliver() waiting forever.
+                        logger.exception("on_sent callback failed for user %s", chat_id)
+            self._finish(fanout)
+
+    # ── public API ─────────────────────────────────────────────────────────────
+
+    async def deliver(
+        self,
+        bot: Bot,
+        chat_ids: Iterable[int],
+        text: str,
+        on_sent: Optional[OnSent] = None,
+        observe: bool = True,
+        **send_kwargs: Any,
+    ) -> DeliveryStats:
+        """Send *text* to every chat in *chat_ids*; extra kwargs go to ``send_message``.
+
+        Pass ``observe=False`` when the call is only part of a fan-out, and
+        hand the merged stats to :func:`metrics.observe_fanout` yourself.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        queue: "asyncio.Queue[Tuple[int, int]]" = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait((chat_id, 0))
+        fanout = _Fanout(queue=queue, stats=DeliveryStats(total=queue.qsize()), pending=queue.qsize())
+        if not fanout.pending:
+            return fanout.stats
+
+        workers = [
+            loop.create_task(self._worker(bot, fanout, text, on_sent, send_kwargs))
+            for _ in range(min(self._concurrency, fanout.pending))
+        ]
+        try:
+            await fanout.done.wait()
+        finally:
+            for timer in fanout.timers:
+                timer.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        fanout.stats.duration = loop.time() - started
+        if observe:
+            observe_fanout(fanout.stats)
+        return fanout.stats
@@ -2,14 +2,84 @@
 Dependency Injection container.
 
 Import `time_trigger` from this module wherever you need the scheduler.
-This ensures a single APSchedulerTimeTrigger instance is shared across the
-entire application instead of each module creating its own.
+This ensures a single trigger engine instance is shared across the entire
+application instead of each module creating its own. TIME_TRIGGER selects
+the engine: "apscheduler" (default, one cron job per slot) or "heap" (one
+timer over a min-heap of all slots, for large catalogs).
+
+The same goes for `delivery`, the rate-limited fan-out engine shared by
+scheduled notifications and broadcasts, for `storage` (the persistence
+backend, chosen by the STORAGE_BACKEND env var) and `write_behind`, the
+queue every mutation goes through on its way to `storage`.
+
+Fan-outs should go through `sender`: the local `delivery` engine, or, when
+DELIVERY_SHARDS > 0, the `shard_coordinator` that spreads sends over that many
+worker processes.
 """
 
+import os
+from typing import Optional
+
+from delivery import DeliveryEngine, Sender
+from occurrences import OccurrenceIndex
+from payloads import PayloadCache
+from sharding import ShardCoordinator
+from storage import MemoryStorage, SQLiteStorage
+from storage_abs import StorageAbs
 from time_trigger_abs import TimeTriggerAbs
 from time_trigger import APSchedulerTimeTrigger
+from time_trigger_heap import HeapTimeTrigger
+from write_behind import WriteBehindQueue
+
+# Concrete fire datetimes of every registered event. Kept up to date by the
+# trigger engine and shared with commands that list upcoming notifications.
+occurrences: OccurrenceIndex = OccurrenceIndex()
+
+# Notification messages, compiled once per (event, slot) at registration.
+# PAYLOAD_STRICT=1 rejects malformed Markdown instead of auto-escaping it.
+payloads: PayloadCache = PayloadCache(strict=os.getenv("PAYLOAD_STRICT", "0") == "1")
 
 # The sole scheduler instance used throughout the application.
 # Type is annotated as the abstract base so callers depend on the interface,
 # not the concrete implementation.
-time_trigger: TimeTriggerAbs = APSchedulerTimeTrigger()
+time_trigger: TimeTriggerAbs = (
+    HeapTimeTrigger(occurrences, payloads)
+    if os.getenv("TIME_TRIGGER", "apscheduler") == "heap"
+    else APSchedulerTimeTrigger(occurrences, payloads)
+)
+
+# "memory" (default) keeps nothing across restarts, "sqlite" persists to SQLITE_PATH.
+STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "memory")
+
+storage: StorageAbs = (
+    SQLiteStorage(os.getenv("SQLITE_PATH", "ntfly.sqlite3"))
+    if STORAGE_BACKEND == "sqlite"
+    else MemoryStorage()
+)
+
+write_behind: WriteBehindQueue = WriteBehindQueue(
+    storage,
+    max_batch=int(os.getenv("WRITE_BEHIND_BATCH", "500")),
+    flush_interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5")),
+)
+
+DELIVERY_RATE: float = float(os.getenv("DELIVERY_RATE", "30"))
+DELIVERY_CONCURRENCY: int = int(os.getenv("DELIVERY_CONCURRENCY", "16"))
+DELIVERY_SHARDS: int = int(os.getenv("DELIVERY_SHARDS", "0"))
+
+# Shared so that every fan-out draws from the same global rate limit.
+delivery: DeliveryEngine = DeliveryEngine(rate=DELIVERY_RATE, concurrency=DELIVERY_CONCURRENCY)
+
+# Worker processes split DELIVERY_RATE between them; started in post_init.
+shard_coordinator: Optional[ShardCoordinator] = (
+    ShardCoordinator(
+        DELIVERY_SHARDS,
+        rate=DELIVERY_RATE,
+        concurrency=DELIVERY_CONCURRENCY,
+        base_url=os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot"),
+    )
+    if DELIVERY_SHARDS > 0
+    else None
+)
+
+sender: Sender = shard_coordinator or delivery
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot
+
+from delivery import DeliveryStats
+from models import Event, TimeSlot
+from outbox import Outbox, outbox
+
+logger = logging.getLogger(__name__)
+
+
+class DigestCoalescer:
+    """Sits between the trigger callback and the outbox and groups same-time fires.
+
+    The first fire for a given scheduled time opens a group and waits
+    *window* seconds; every other fire for that time joins it and returns at
+    once. The group then goes to :meth:`Outbox.fire_group`, which sends each
+    user one digest for all of their events instead of one message per
+    (event, slot). A non-positive window passes fires straight through.
+    """
+
+    def __init__(self, box: Outbox, window: float = 1.0) -> None:
+        self._outbox = box
+        self._window = window
+        self._pending: Dict[datetime, List[Tuple[Event, TimeSlot]]] = {}
+
+    async def fire(
+        self, bot: Bot, event: Event, slot: TimeSlot, at: datetime
+    ) -> Optional[DeliveryStats]:
+        """Deliver *slot* of *event* with whatever else fires at *at*.
+
+        Returns the group's stats to the fire that opened it and ``None`` to the ones that joined.
+        """
+        if self._window <= 0:
+            return await self._outbox.fire(bot, event, slot, at)
+        group = self._pending.get(at)
+        if group is not None:
+            group.append((event, slot))
+            return None
+        group = self._pending[at] = [(event, slot)]
+        try:
+            await asyncio.sleep(self._window)
+        finally:
+            del self._pending[at]
+        if len(group) > 1:
+            logger.info("Releasing %d fire(s) due at %s together.", len(group), at.strftime("%H:%M"))
+        return await self._outbox.fire_group(bot, group, at)
+
+    def pending(self) -> int:
+        """Fires waiting for their group to be released."""
+        return sum(len(group) for group in self._pending.values())
+
+
+# Seconds a fire waits for others due at the same time; 0 sends each one on its own.
+DIGEST_WINDOW: float = float(os.getenv("DIGEST_WINDOW", "1"))
+
+digests = DigestCoalescer(outbox, DIGEST_WINDOW)
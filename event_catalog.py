@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import list_db
+from di import time_trigger
+from models import Event, TimeSlot, WeekSchedule
+from time_trigger_abs import TimeTriggerAbs, TriggerCallback
+
+logger = logging.getLogger(__name__)
+
+
+# ── file format ────────────────────────────────────────────────────────────────
+# A JSON list of events. Weeks map day names to lists of {"time", "description"};
+# days without slots may be left out:
+#
+#   [{"id": 1, "name": "...", "description": "...",
+#     "from_date": "2025-09-01", "till_date": "2026-06-30",
+#     "top_week": {"tuesday": [{"time": "09:00", "description": "..."}]},
+#     "bottom_week": {}, "misfire_policy": "grace", "misfire_grace": 900}]
+#
+# misfire_policy / misfire_grace are optional, see catch_up.
+
+
+def _parse_week(raw: Dict[str, Any]) -> WeekSchedule:
+    return WeekSchedule(**{
+        day: [TimeSlot(time=s["time"], description=s["description"]) for s in slots]
+        for day, slots in raw.items()
+    })
+
+
+MISFIRE_POLICIES = ("skip", "grace", "coalesce")
+
+
+def parse_event(raw: Dict[str, Any]) -> Event:
+    policy = raw.get("misfire_policy", "grace")
+    if policy not in MISFIRE_POLICIES:
+        raise ValueError(f"Event {raw.get('id')}: unknown misfire_policy {policy!r}")
+    return Event(
+        id=int(raw["id"]),
+        name=raw["name"],
+        description=raw["description"],
+        from_date=date.fromisoformat(raw["from_date"]),
+        till_date=date.fromisoformat(raw["till_date"]),
+        top_week=_parse_week(raw.get("top_week", {})),
+        bottom_week=_parse_week(raw.get("bottom_week", {})),
+        misfire_policy=policy,
+        misfire_grace=int(raw.get("misfire_grace", 900)),
+    )
+
+
+def load_events(path: str) -> List[Event]:
+    """Read and validate *path*. Raises ``ValueError`` on a malformed catalog."""
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    try:
+        events = [parse_event(item) for item in raw]
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"Malformed event in {path}: {exc!r}") from exc
+    ids = [e.id for e in events]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"Duplicate event ids in {path}")
+    return events
+
+
+def diff_events(
+    old: Dict[int, Event], new: List[Event]
+) -> Tuple[List[Event], List[int], List[Event]]:
+    """(added, removed ids, changed) between the live catalog and *new*."""
+    new_by_id = {e.id: e for e in new}
+    added = [e for e in new if e.id not in old]
+    removed = [i for i in old if i not in new_by_id]
+    changed = [e for e in new if e.id in old and old[e.id] != e]
+    return added, removed, changed
+
+
+# ── hot reload ─────────────────────────────────────────────────────────────────
+
+
+class EventCatalog:
+    """Keeps ``list_db.events`` and the trigger engine in sync with a JSON file.
+
+    The file is polled every *interval* seconds. On a change it is parsed and
+    diffed against the live catalog by event id; only removed and changed
+    events go through ``remove_trigger`` and only added and changed ones
+    through ``add_trigger``, so an edit costs O(events touched), not a full
+    rebuild. Subscriptions are keyed by event id and are left alone. A file
+    that fails to parse is logged and ignored until it changes again.
+    """
+
+    def __init__(self, path: str, trigger: TimeTriggerAbs, interval: float = 5.0) -> None:
+        self._path = path
+        self._trigger = trigger
+        self._interval = interval
+        self._func: Optional[TriggerCallback] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    async def _register(self, events: List[Event]) -> None:
+        for event in events:
+            try:
+                await self._trigger.add_trigger(event, self._func)
+            except ValueError as exc:
+                logger.error("Event %s not scheduled: %s", event.id, exc)
+
+    async def load(self, func: TriggerCallback) -> None:
+        """Initial load: set the catalog and register every event with *func*."""
+        self._func = func
+        self._signature = self._stat()
+        events = load_events(self._path)
+        list_db.set_events(events)
+        await self._register(events)
+
+    async def reload(self) -> bool:
+        """Apply the file's current contents. Returns whether anything changed."""
+        try:
+            events = load_events(self._path)
+        except (OSError, ValueError) as exc:
+            logger.error("Keeping the current catalog, %s is unusable: %s", self._path, exc)
+            return False
+
+        added, removed, changed = diff_events(list_db.events_by_id, events)
+        reordered = [e.id for e in events] != [e.id for e in list_db.events]
+        if not (added or removed or changed or reordered):
+            return False
+        for event_id in removed:
+            await self._trigger.remove_trigger(event_id)
+        for event in changed:
+            await self._trigger.remove_trigger(event.id)
+        list_db.set_events(events)
+        await self._register(added + changed)
+        logger.info(
+            "Reloaded %s: %d added, %d removed, %d changed.",
+            self._path, len(added), len(removed), len(changed),
+        )
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                continue
+            self._signature = signature
+            await self.reload()
+
+    def watch(self) -> None:
+        """Start polling the file. A non-positive interval disables hot reload."""
+        if self._interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+catalog = EventCatalog(
+    os.getenv("EVENTS_FILE", "events.json"),
+    time_trigger,
+    interval=float(os.getenv("EVENTS_RELOAD_INTERVAL", "5")),
+)
@@ -0,0 +1,321 @@
+"""
+Local stand-in for the Telegram Bot API, for load tests.
+
+Implements the methods the bot uses (getMe, sendMessage, editMessageText,
+answerCallbackQuery, deleteMessage, getUpdates, setWebhook, deleteWebhook)
+on a plain asyncio HTTP/1.1 server, with configurable latency, flood-limit
+429s, random 429s and random 5xx errors. Updates queued with
+:meth:`FakeBotAPI.push_update` are served to getUpdates long polls, or POSTed
+to the registered webhook.
+
+Point the bot at it with BOT_API_BASE_URL=http://127.0.0.1:8081/bot, or run
+it under load_harness.py. Standalone:
+
+    python fake_bot_api.py --port 8081 --latency-ms 50 --flood-limit 30
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.03  # seconds added to every call
+    jitter: float = 0.02  # uniform extra latency in [0, jitter)
+    flood_limit: float = 0.0  # outgoing messages per second before 429s (0 = unlimited)
+    retry_after: int = 1  # seconds reported in 429 responses
+    rate_limit_rate: float = 0.0  # probability of a random 429 on a send
+    error_rate: float = 0.0  # probability of a 500 on any call
+    seed: Optional[int] = None
+
+
+@dataclass
+class Call:
+    method: str
+    params: Dict[str, Any]
+    at: float  # time.monotonic() when the request arrived
+    status: int = 200
+
+
+@dataclass
+class _Flood:
+    rate: float
+    tokens: float = 0.0
+    updated: float = field(default_factory=time.monotonic)
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+# Methods that count as an outgoing message for the flood limit and random 429s.
+_SENDS = {"sendMessage", "editMessageText"}
+
+
+def _parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    params: Dict[str, Any] = {}
+    for key, value in parse_qsl(body.decode(), keep_blank_values=True):
+        # PTB form-encodes scalars as-is and everything else as JSON.
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+class FakeBotAPI:
+    """In-process fake Bot API server. Every call is appended to :attr:`calls`."""
+
+    def __init__(self, config: Optional[FakeConfig] = None) -> None:
+        self.config = config = config or FakeConfig()
+        self.calls: List[Call] = []
+        self.webhook: Optional[Tuple[str, str]] = None  # (url, secret)
+        self._rng = random.Random(config.seed)
+        self._flood = _Flood(config.flood_limit, config.flood_limit) if config.flood_limit else None
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._update_id = 0
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._webhook_tasks: set = set()
+        self.on_call: Optional[Callable[[Call], None]] = None
+        self._methods: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+            "getMe": self._get_me,
+            "sendMessage": self._send_message,
+            "editMessageText": self._edit_message_text,
+            "answerCallbackQuery": self._true,
+            "deleteMessage": self._true,
+            "getUpdates": self._get_updates,
+            "setWebhook": self._set_webhook,
+            "deleteWebhook": self._delete_webhook,
+            "close": self._true,
+            "logOut": self._true,
+        }
+
+    # ── Bot API methods ────────────────────────────────────────────────────────
+
+    async def _true(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    async def _get_me(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+    def _message(self, chat_id: int, text: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+
+    async def _send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._message(int(params["chat_id"]), str(params.get("text", "")))
+
+    async def _edit_message_text(self, params: Dict[str, Any]) -> Any:
+        if "inline_message_id" in params:
+            return True
+        return self._message(int(params["chat_id"]), str(params.get("text", "")), int(params["message_id"]))
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return [u for _, u in zip(range(limit), self._updates)]
+
+    async def _set_webhook(self, params: Dict[str, Any]) -> bool:
+        self.webhook = (params["url"], str(params.get("secret_token", "")))
+        while self._updates:
+            self._post_to_webhook(self._updates.popleft())
+        return True
+
+    async def _delete_webhook(self, params: Dict[str, Any]) -> bool:
+        self.webhook = None
+        if params.get("drop_pending_updates"):
+            self._updates.clear()
+        return True
+
+    # ── update injection ───────────────────────────────────────────────────────
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Queue *update* (without ``update_id``) for the bot. Returns its update id."""
+        self._update_id += 1
+        update = {"update_id": self._update_id, **update}
+        if self.webhook is not None:
+            self._post_to_webhook(update)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+        return self._update_id
+
+    def _post_to_webhook(self, update: Dict[str, Any]) -> None:
+        task = asyncio.get_running_loop().create_task(self._deliver_webhook(update))
+        self._webhook_tasks.add(task)
+        task.add_done_callback(self._webhook_tasks.discard)
+
+    async def _deliver_webhook(self, update: Dict[str, Any]) -> None:
+        url, secret = self.webhook
+        parts = urlsplit(url)
+        body = json.dumps(update).encode()
+        try:
+            reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write(
+                f"POST {parts.path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+            status = await reader.readline()
+            writer.close()
+            if b" 200 " not in status:
+                logger.warning("Webhook answered %r", status.strip())
+        except OSError as exc:
+            logger.warning("Webhook delivery failed: %s", exc)
+
+    # ── HTTP plumbing ──────────────────────────────────────────────────────────
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        call = Call(method, params, time.monotonic())
+        self.calls.append(call)
+        if self.on_call is not None:
+            self.on_call(call)
+        cfg = self.config
+        handler = self._methods.get(method)
+        if handler is None:
+            call.status = 404
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+        if method != "getUpdates":
+            await asyncio.sleep(cfg.latency + self._rng.random() * cfg.jitter)
+        if cfg.error_rate and self._rng.random() < cfg.error_rate:
+            call.status = 500
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        if method in _SENDS and (
+            (self._flood is not None and not self._flood.take())
+            or (cfg.rate_limit_rate and self._rng.random() < cfg.rate_limit_rate)
+        ):
+            call.status = 429
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {cfg.retry_after}",
+                "parameters": {"retry_after": cfg.retry_after},
+            }
+        return 200, {"ok": True, "result": await handler(params)}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                path, _, query = path.partition("?")
+                params = dict(parse_qsl(query))
+                params.update(_parse_body(headers.get("content-type", ""), body))
+                status, payload = await self._call(path.rsplit("/", 1)[-1], params)
+
+                out = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(out)}\r\n\r\n".encode()
+                    + out
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled = a long poll still open when the server shuts down.
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening. Returns the bound port (pass 0 to pick a free one)."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def summary(self) -> Dict[str, int]:
+        """Calls per ``method:status``."""
+        return dict(Counter(f"{c.method}:{c.status}" for c in self.calls))
+
+
+async def _serve_forever(args: argparse.Namespace) -> None:
+    api = FakeBotAPI(FakeConfig(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        flood_limit=args.flood_limit,
+        retry_after=args.retry_after,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+    ))
+    port = await api.start(args.host, args.port)
+    logger.info("Fake Bot API on http://%s:%d/bot", args.host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        logger.info("Calls: %s", api.summary())
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--flood-limit", type=float, default=0.0, help="msg/s before 429s, 0 = off")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="probability of a random 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 500")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s | %(levelname)s | %(message)s", level=logging.INFO)
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=8081)
+    add_config_arguments(cli)
+    try:
+        asyncio.run(_serve_forever(cli.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,165 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+import list_db
+from keyboards import PAGE_SIZE, get_subscribe_keyboard, get_unsubscribe_keyboard
+from models import Event
+
+# Rough per-object costs used to keep the cache under its byte budget.
+_MARKUP_OVERHEAD = 256
+_BUTTON_OVERHEAD = 160
+
+
+def _estimate_size(markup: InlineKeyboardMarkup) -> int:
+    size = _MARKUP_OVERHEAD
+    for row in markup.inline_keyboard:
+        for button in row:
+            size += _BUTTON_OVERHEAD + 2 * len(button.text) + len(button.callback_data or "")
+    return size
+
+
+class KeyboardCache:
+    """LRU cache of rendered keyboards, bounded by an estimated byte budget.
+
+    Keys carry the user's subscription version and the catalog version, so
+    entries never need explicit invalidation: stale ones simply stop being
+    asked for and age out.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[InlineKeyboardMarkup, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(
+        self, key: Hashable, build: Callable[[], Optional[InlineKeyboardMarkup]]
+    ) -> Optional[InlineKeyboardMarkup]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        markup = build()
+        if markup is None:
+            return None
+        size = _estimate_size(markup)
+        self._entries[key] = (markup, size)
+        self._bytes += size
+        while self._bytes > self._max_bytes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+        return markup
+
+
+# ── cursor pagination ──────────────────────────────────────────────────────────
+# A cursor is a position in `list_db.events`. A page starting at cursor C holds
+# the first PAGE_SIZE events at positions >= C the user is not subscribed to,
+# so rendering a page only scans as far as it needs, never the whole catalog.
+
+
+def available_page(
+    telegram_id: int, cursor: int
+) -> Tuple[List[Event], Optional[int], Optional[int]]:
+    """Events on the page at *cursor*, plus the previous and next page cursors."""
+    catalog = list_db.events
+    subscribed = set(list_db.subscriptions.events_of(telegram_id))
+
+    page: List[Event] = []
+    position = cursor
+    next_cursor: Optional[int] = None
+    while position < len(catalog):
+        event = catalog[position]
+        if event.id not in subscribed:
+            if len(page) == PAGE_SIZE:
+                next_cursor = position
+                break
+            page.append(event)
+        position += 1
+
+    prev_cursor: Optional[int] = None
+    found = 0
+    position = min(cursor, len(catalog)) - 1
+    while position >= 0 and found < PAGE_SIZE:
+        if catalog[position].id not in subscribed:
+            found += 1
+            prev_cursor = position
+        position -= 1
+    return page, prev_cursor, next_cursor
+
+
+def subscribed_page(
+    telegram_id: int, cursor: int
+) -> Tuple[List[Event], Optional[int], Optional[int]]:
+    """Like :func:`available_page`, over the user's own subscriptions sorted by id."""
+    event_ids = [i for i in list_db.subscriptions.events_of(telegram_id) if i in list_db.events_by_id]
+    page = [list_db.events_by_id[i] for i in event_ids[cursor:cursor + PAGE_SIZE]]
+    prev_cursor = max(0, cursor - PAGE_SIZE) if cursor > 0 else None
+    next_cursor = cursor + PAGE_SIZE if cursor + PAGE_SIZE < len(event_ids) else None
+    return page, prev_cursor, next_cursor
+
+
+def legacy_available_cursor(telegram_id: int, page: int) -> int:
+    """Cursor of page *page* as old buttons counted it: PAGE_SIZE available events per page."""
+    subscribed = set(list_db.subscriptions.events_of(telegram_id))
+    skip = page * PAGE_SIZE
+    for position, event in enumerate(list_db.events):
+        if event.id not in subscribed:
+            if not skip:
+                return position
+            skip -= 1
+    return len(list_db.events)
+
+
+def legacy_subscribed_cursor(page: int) -> int:
+    """Cursor of page *page* of the user's subscriptions as old buttons counted it."""
+    return page * PAGE_SIZE
+
+
+def _build(
+    pager: Callable[[int, int], Tuple[List[Event], Optional[int], Optional[int]]],
+    factory: Callable[[List[Event], Optional[int], Optional[int]], InlineKeyboardMarkup],
+    telegram_id: int,
+    cursor: int,
+) -> Optional[InlineKeyboardMarkup]:
+    events, prev_cursor, next_cursor = pager(telegram_id, cursor)
+    if not events and prev_cursor is None:
+        return None
+    return factory(events, prev_cursor, next_cursor)
+
+
+def _key(kind: str, telegram_id: int, cursor: int) -> Hashable:
+    return (
+        kind,
+        telegram_id,
+        list_db.subscriptions.version(telegram_id),
+        list_db.catalog_version,
+        cursor,
+    )
+
+
+def subscribe_markup(telegram_id: int, cursor: int = 0) -> Optional[InlineKeyboardMarkup]:
+    """Subscribe keyboard for the page at *cursor*, or ``None`` if nothing is available."""
+    return keyboard_cache.get_or_build(
+        _key("subscribe", telegram_id, cursor),
+        lambda: _build(available_page, get_subscribe_keyboard, telegram_id, cursor),
+    )
+
+
+def unsubscribe_markup(telegram_id: int, cursor: int = 0) -> Optional[InlineKeyboardMarkup]:
+    """Unsubscribe keyboard for the page at *cursor*, or ``None`` if there are no subscriptions."""
+    return keyboard_cache.get_or_build(
+        _key("unsubscribe", telegram_id, cursor),
+        lambda: _build(subscribed_page, get_unsubscribe_keyboard, telegram_id, cursor),
+    )
+
+
+keyboard_cache = KeyboardCache(int(os.getenv("KEYBOARD_CACHE_BYTES", str(32 * 1024 * 1024))))
@@ -1,67 +1,80 @@
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from typing import List
+from typing import List, Optional
+
+from callback_data import (
+    CANCEL_ALL,
+    MENU,
+    SUBSCRIBE,
+    SUBSCRIBE_PAGE,
+    SUBSCRIBE_START,
+    UNSUBSCRIBE,
+    UNSUBSCRIBE_PAGE,
+    UNSUBSCRIBE_START,
+    encode,
+)
 from models import Event
 
 PAGE_SIZE = 5
 
 
+@lru_cache(maxsize=2)
 def get_menu_keyboard(has_subscriptions: bool) -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton("📋 Subscribe", callback_data="subscribe_start")],
-        [InlineKeyboardButton("🔕 Unsubscribe", callback_data="unsubscribe_start")],
+        [InlineKeyboardButton("📋 Subscribe", callback_data=encode(SUBSCRIBE_START))],
+        [InlineKeyboardButton("🔕 Unsubscribe", callback_data=encode(UNSUBSCRIBE_START))],
     ]
     if has_subscriptions:
         buttons.append(
-            [InlineKeyboardButton("❌ Cancel All Notifications", callback_data="cancel_all")]
+            [InlineKeyboardButton(
+                "❌ Cancel All Notifications",
+                callback_data=encode(CANCEL_ALL),
+            )]
         )
     return InlineKeyboardMarkup(buttons)
 
 
-def get_subscribe_keyboard(
+def _get_events_keyboard(
     events: List[Event],
-    page: int,
+    action: str,
+    page_action: str,
+    prev_cursor: Optional[int],
+    next_cursor: Optional[int],
 ) -> InlineKeyboardMarkup:
-    start = page * PAGE_SIZE
-    end = start + PAGE_SIZE
-    page_events = events[start:end]
-
     buttons: List[List[InlineKeyboardButton]] = [
-        [InlineKeyboardButton(e.name, callback_data=f"do_subscribe:{e.id}")]
-        for e in page_events
+        [InlineKeyboardButton(e.name, callback_data=encode(action, e.id))]
+        for e in events
     ]
 
     nav: List[InlineKeyboardButton] = []
-    if page > 0:
-        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"subscribe_page:{page - 1}"))
-    if end < len(events):
-        nav.append(InlineKeyboardButton("➡️ Next", callback_data=f"subscribe_page:{page + 1}"))
+    if prev_cursor is not None:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=encode(page_action, prev_cursor)))
+    if next_cursor is not None:
+        nav.append(InlineKeyboardButton("➡️ Next", callback_data=encode(page_action, next_cursor)))
     if nav:
         buttons.append(nav)
 
-    buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="menu")])
+    buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data=encode(MENU))])
     return InlineKeyboardMarkup(buttons)
 
 
-def get_unsubscribe_keyboard(
+def get_subscribe_keyboard(
     events: List[Event],
-    page: int,
+    prev_cursor: Optional[int],
+    next_cursor: Optional[int],
 ) -> InlineKeyboardMarkup:
-    start = page * PAGE_SIZE
-    end = start + PAGE_SIZE
-    page_events = events[start:end]
+    """One page of events to subscribe to; cursors are the neighbouring pages' starts."""
+    return _get_events_keyboard(
+        events, SUBSCRIBE, SUBSCRIBE_PAGE, prev_cursor, next_cursor
+    )
 
-    buttons: List[List[InlineKeyboardButton]] = [
-        [InlineKeyboardButton(e.name, callback_data=f"do_unsubscribe:{e.id}")]
-        for e in page_events
-    ]
 
-    nav: List[InlineKeyboardButton] = []
-    if page > 0:
-        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"unsubscribe_page:{page - 1}"))
-    if end < len(events):
-        nav.append(InlineKeyboardButton("➡️ Next", callback_data=f"unsubscribe_page:{page + 1}"))
-    if nav:
-        buttons.append(nav)
-
-    buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="menu")])
-    return InlineKeyboardMarkup(buttons)
+def get_unsubscribe_keyboard(
+    events: List[Event],
+    prev_cursor: Optional[int],
+    next_cursor: Optional[int],
+) -> InlineKeyboardMarkup:
+    """One page of subscribed events; cursors are the neighbouring pages' starts."""
+    return _get_events_keyboard(
+        events, UNSUBSCRIBE, UNSUBSCRIBE_PAGE, prev_cursor, next_cursor
+    )
@@ -1,48 +1,132 @@
-from datetime import date
-from typing import List
-
-from models import Event, TimeSlot, User, WeekSchedule
-
-users: List[User] = []
-
-events: List[Event] = [
-    Event(
-        id=1,
-        name="НПИ - Онлайн лекции",
-        description="Напоминание для НПИшников про онлайн лекции",
-        from_date=date(2025, 9, 1),
-        till_date=date(2026, 6, 30),
-        top_week=WeekSchedule(
-            tuesday=[
-                TimeSlot(
-                    time="09:00",
-                    description="*Основы информационной безопасности*\nСсылка: ???",
-                )
-            ],
-            friday=[
-                TimeSlot(
-                    time="09:00",
-                    description="*Вычислительные системы, сети и телекоммуникации*\nСсылка: ",
-                )
-            ],
-        ),
-        bottom_week=WeekSchedule(
-            tuesday=[
-                TimeSlot(
-                    time="09:00",
-                    description="*Интеллектуальные системы*\nСсылка: https://telemost.yandex.ru/j/5081495234",
-                ),
-                TimeSlot(
-                    time="10:30",
-                    description="*Теория вероятностей и математическая статистика*\nСсылка: https://telemost.yandex.ru/j/6626217220",
-                ),
-            ],
-            friday=[
-                TimeSlot(
-                    time="09:00",
-                    description="*Структуры данных и парадигмы программирования*\nСсылка: https://telemost.yandex.ru/j/9547126616",
-                )
-            ],
-        ),
-    )
-]
+import time
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from di import write_behind
+from metrics import DEACTIVATIONS
+from models import Event, User
+from storage_abs import StorageAbs
+from subscription_index import SubscriptionIndex
+from user_registry import UserRegistry
+
+users = UserRegistry()
+
+# Loaded from EVENTS_FILE in post_init and replaced on hot reload (see event_catalog).
+events: List[Event] = []
+
+events_by_id: Dict[int, Event] = {}
+
+# Bumped whenever `events` changes, so cached views of the catalog go stale.
+catalog_version: int = 0
+
+# Single source of truth for who is subscribed to what.
+subscriptions = SubscriptionIndex()
+
+# Users who want every fire as its own message instead of a digest.
+digest_opt_outs: Set[int] = set()
+
+
+def get_event(event_id: Union[int, str]) -> Optional[Event]:
+    """O(1) event lookup. Accepts the raw string from a command or callback."""
+    if isinstance(event_id, str):
+        if not event_id.isdigit():
+            return None
+        event_id = int(event_id)
+    return events_by_id.get(event_id)
+
+
+def get_user(telegram_id: int) -> Optional[User]:
+    return users.get(telegram_id)
+
+
+def wants_digest(telegram_id: int) -> bool:
+    return telegram_id not in digest_opt_outs
+
+
+def users_after(user_id: int, limit: int) -> List[User]:
+    """Up to *limit* users with ``User.id > user_id``, in id order."""
+    return users.after(user_id, limit)
+
+
+def set_events(new_events: List[Event]) -> None:
+    """Swap in a new catalog. Subscriptions are keyed by event id and survive."""
+    global catalog_version
+    events[:] = new_events
+    events_by_id.clear()
+    events_by_id.update((e.id, e) for e in new_events)
+    catalog_version += 1
+
+
+# ── mutations ──────────────────────────────────────────────────────────────────
+# Every change is applied to memory first and then queued for the storage
+# backend, so callers never wait on disk. Each one is a synchronous
+# check-and-set with no await inside, so it is atomic with respect to other
+# handlers even when updates are processed concurrently.
+
+
+def add_user(telegram_id: int) -> User:
+    user = users.add(telegram_id)
+    write_behind.put("add_user", user.id, user.telegram_id)
+    return user
+
+
+def subscribe(event_id: int, telegram_id: int) -> bool:
+    added = subscriptions.subscribe(event_id, telegram_id)
+    if added:
+        write_behind.put("subscribe", event_id, telegram_id)
+    return added
+
+
+def unsubscribe(event_id: int, telegram_id: int) -> bool:
+    removed = subscriptions.unsubscribe(event_id, telegram_id)
+    if removed:
+        write_behind.put("unsubscribe", event_id, telegram_id)
+    return removed
+
+
+def unsubscribe_all(telegram_id: int) -> List[int]:
+    removed = subscriptions.unsubscribe_all(telegram_id)
+    if removed:
+        write_behind.put("unsubscribe_all", telegram_id)
+    return removed
+
+
+def deactivate(telegram_ids: Iterable[int]) -> List[int]:
+    """Stop fanning out to users after a permanent delivery error. Returns the newly inactive ids."""
+    changed = subscriptions.deactivate(telegram_ids)
+    now = time.time()
+    for telegram_id in changed:
+        write_behind.put("deactivate", telegram_id, now)
+    DEACTIVATIONS.inc(amount=len(changed))
+    return changed
+
+
+def reactivate(telegram_id: int) -> bool:
+    reactivated = subscriptions.reactivate(telegram_id)
+    if reactivated:
+        write_behind.put("reactivate", telegram_id)
+    return reactivated
+
+
+def set_digest(telegram_id: int, enabled: bool) -> bool:
+    """Turn digests on or off for *telegram_id*. Returns ``False`` if nothing changed."""
+    if enabled == wants_digest(telegram_id):
+        return False
+    if enabled:
+        digest_opt_outs.discard(telegram_id)
+        write_behind.put("digest_on", telegram_id)
+    else:
+        digest_opt_outs.add(telegram_id)
+        write_behind.put("digest_off", telegram_id)
+    return True
+
+
+# ── cache warm-up ──────────────────────────────────────────────────────────────
+
+
+async def load(storage: StorageAbs) -> None:
+    """Populate the in-memory cache from *storage*. Called once in post_init."""
+    users.load(await storage.load_users())
+    subscriptions.load(await storage.load_subscriptions())
+    subscriptions.deactivate(await storage.load_inactive())
+    digest_opt_outs.clear()
+    digest_opt_outs.update(await storage.load_digest_opt_outs())
@@ -0,0 +1,312 @@
+"""
+End-to-end load test: the real bot against fake_bot_api.py.
+
+Starts the fake Bot API in-process and the bot (main.py) as a subprocess
+pointed at it through BOT_API_BASE_URL, with in-memory storage and a
+throw-away events file holding one event with two slots that fire at the
+next whole minute after the warm-up. Then:
+
+1. every simulated user opens the subscribe list and subscribes to it;
+2. while the event fires, users keep clicking through the menu and pages;
+3. the run waits for the notification burst to drain.
+
+Prints one JSON report: callback latency (push → answerCallbackQuery,
+p50/p99), notification throughput, dropped/duplicate messages and ones
+missing one of the event's two same-minute slots, and API calls per
+method and status.
+
+    python load_harness.py --users 2000 --click-rate 200 --flood-limit 30 --rate-limit-rate 0.01
+    python load_harness.py --mode webhook
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import callback_data
+from fake_bot_api import Call, FakeBotAPI, FakeConfig, add_config_arguments
+
+_TID_BASE = 10_000_000
+_ADMIN_ID = 1
+_NOTIFICATION_PREFIX = "🔔"
+_DAY_FIELDS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# The event has two slots at the fire minute; every notification must carry both.
+_SLOT_TEXTS = ("Lecture A", "Lecture B")
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_events(path: str, fire_at: datetime) -> None:
+    day = {_DAY_FIELDS[fire_at.weekday()]: [
+        {"time": fire_at.strftime("%H:%M"), "description": f"*{text}*\nLink: https://example.com"}
+        for text in _SLOT_TEXTS
+    ]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{
+            "id": 1,
+            "name": "Load test",
+            "description": "Synthetic event for load_harness.py",
+            "from_date": fire_at.date().isoformat(),
+            "till_date": fire_at.date().isoformat(),
+            "top_week": day,
+            "bottom_week": day,
+            "misfire_policy": "skip",
+        }], f)
+
+
+class Harness:
+    def __init__(self, api: FakeBotAPI, args: argparse.Namespace) -> None:
+        self.api = api
+        self.args = args
+        self.latencies: List[float] = []
+        self.timeouts = 0
+        self.subscribed: set = set()
+        self._query_id = 0
+        self._answers: Dict[str, asyncio.Future] = {}
+        self._ready = asyncio.get_running_loop().create_future()
+        api.on_call = self._on_call
+
+    def _on_call(self, call: Call) -> None:
+        if call.method in ("getUpdates", "setWebhook") and not self._ready.done():
+            self._ready.set_result(None)
+        elif call.method == "answerCallbackQuery":
+            future = self._answers.pop(str(call.params.get("callback_query_id")), None)
+            if future is not None and not future.done():
+                future.set_result(call.at)
+
+    async def wait_ready(self, timeout: float) -> None:
+        await asyncio.wait_for(self._ready, timeout)
+        if self.api.webhook is None:
+            return
+        # setWebhook may arrive before the bot's own server accepts connections.
+        url = urlsplit(self.api.webhook[0])
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(url.hostname, url.port)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            return
+
+    async def click(self, telegram_id: int, data: str) -> bool:
+        """Push one callback and wait for the bot to answer it. Returns whether it did."""
+        self._query_id += 1
+        query_id = str(self._query_id)
+        answered = asyncio.get_running_loop().create_future()
+        self._answers[query_id] = answered
+        pushed = time.monotonic()
+        self.api.push_update({"callback_query": {
+            "id": query_id,
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "Load"},
+            "chat_instance": "load",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": telegram_id, "type": "private"},
+                "text": "…",
+            },
+        }})
+        try:
+            at = await asyncio.wait_for(answered, self.args.click_timeout)
+        except asyncio.TimeoutError:
+            self._answers.pop(query_id, None)
+            self.timeouts += 1
+            return False
+        self.latencies.append(at - pushed)
+        return True
+
+    async def subscribe_user(self, telegram_id: int) -> None:
+        if not await self.click(telegram_id, callback_data.encode(callback_data.SUBSCRIBE_START)):
+            return
+        if await self.click(telegram_id, callback_data.encode(callback_data.SUBSCRIBE, 1)):
+            self.subscribed.add(telegram_id)
+
+    async def browse(self, telegram_id: int) -> None:
+        for data in (
+            callback_data.encode(callback_data.MENU),
+            callback_data.encode(callback_data.UNSUBSCRIBE_START),
+            callback_data.encode(callback_data.MENU),
+        ):
+            await self.click(telegram_id, data)
+
+    async def arrive(self, coros: List[Any], rate: float) -> None:
+        """Start *coros* at *rate* per second and wait for all of them."""
+        tasks = []
+        for coro in coros:
+            tasks.append(asyncio.get_running_loop().create_task(coro))
+            await asyncio.sleep(1 / rate)
+        await asyncio.gather(*tasks)
+
+    def notifications(self) -> List[Call]:
+        return [
+            c for c in self.api.calls
+            if c.method == "sendMessage" and c.status == 200
+            and str(c.params.get("text", "")).startswith(_NOTIFICATION_PREFIX)
+        ]
+
+
+def _bot_env(args: argparse.Namespace, base_url: str, events_file: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123456:LOAD-TEST",
+        "ADMIN_ID": str(_ADMIN_ID),
+        "BOT_API_BASE_URL": base_url,
+        "EVENTS_FILE": events_file,
+        "EVENTS_RELOAD_INTERVAL": "0",
+        "STORAGE_BACKEND": "memory",
+        "BOT_MODE": args.mode,
+        "DIGEST_WINDOW": str(args.digest_window),
+    })
+    if args.mode == "webhook":
+        port = _free_port()
+        env.update({
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(port),
+            "WEBHOOK_PATH": "telegram",
+            "WEBHOOK_URL": f"http://127.0.0.1:{port}/telegram",
+            "WEBHOOK_SECRET": "load-test",
+        })
+    return env
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    api = FakeBotAPI(FakeConfig(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        flood_limit=args.flood_limit,
+        retry_after=args.retry_after,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ))
+    port = await api.start()
+    harness = Harness(api, args)
+    users = [_TID_BASE + i for i in range(args.users)]
+
+    # Subscribing takes two clicks per user; leave a margin before the fire.
+    warmup = args.startup_timeout + 2 * args.users / args.click_rate + args.lead
+    fire_at = (datetime.now() + timedelta(seconds=warmup, minutes=1)).replace(second=0, microsecond=0)
+
+    workdir = tempfile.mkdtemp(prefix="ntfly-load-")
+    events_file = os.path.join(workdir, "events.json")
+    write_events(events_file, fire_at)
+    log = open(os.path.join(workdir, "bot.log"), "wb")
+    bot = await asyncio.create_subprocess_exec(
+        sys.executable, "main.py",
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=_bot_env(args, f"http://127.0.0.1:{port}/bot", events_file),
+        stdout=log, stderr=log,
+    )
+    try:
+        await harness.wait_ready(args.startup_timeout)
+        await harness.arrive([harness.subscribe_user(u) for u in users], args.click_rate / 2)
+        subscribed_by = datetime.now()
+
+        # Browse around the fire: start a little before it and keep going through the burst.
+        await asyncio.sleep(max(0.0, (fire_at - datetime.now()).total_seconds() - args.lead / 2))
+        fired = time.monotonic() + max(0.0, (fire_at - datetime.now()).total_seconds())
+        browse = asyncio.get_running_loop().create_task(
+            harness.arrive([harness.browse(u) for u in users], args.click_rate / 3)
+        )
+        deadline = fired + args.drain_timeout
+        while time.monotonic() < deadline:
+            if len({int(c.params["chat_id"]) for c in harness.notifications()}) >= len(harness.subscribed):
+                break
+            await asyncio.sleep(0.5)
+        await browse
+    finally:
+        if bot.returncode is None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(bot.wait(), 60)
+            except asyncio.TimeoutError:
+                bot.kill()
+        log.close()
+        await api.stop()
+
+    notes = harness.notifications()
+    per_chat = Counter(int(c.params["chat_id"]) for c in notes)
+    delivered = set(per_chat) & harness.subscribed
+    burst = [c.at for c in notes]
+    duration = (max(burst) - min(burst)) if len(burst) > 1 else 0.0
+    return {
+        "config": {
+            "mode": args.mode,
+            "users": args.users,
+            "click_rate": args.click_rate,
+            "latency_ms": args.latency_ms,
+            "flood_limit": args.flood_limit,
+            "rate_limit_rate": args.rate_limit_rate,
+            "error_rate": args.error_rate,
+            "digest_window": args.digest_window,
+            "fire_at": fire_at.isoformat(),
+            "subscribed_by": subscribed_by.isoformat(timespec="seconds"),
+            "bot_log": log.name,
+        },
+        "callbacks": {
+            "answered": len(harness.latencies),
+            "timed_out": harness.timeouts,
+            "p50_ms": _percentile(harness.latencies, 0.50),
+            "p99_ms": _percentile(harness.latencies, 0.99),
+            "max_ms": _percentile(harness.latencies, 1.0),
+        },
+        "notifications": {
+            "expected": len(harness.subscribed),
+            "delivered": len(delivered),
+            "dropped": len(harness.subscribed - delivered),
+            "duplicates": sum(n - 1 for n in per_chat.values()),
+            "incomplete": sum(
+                1 for c in notes if not all(t in str(c.params.get("text", "")) for t in _SLOT_TEXTS)
+            ),
+            "first_after_fire_ms": round((min(burst) - fired) * 1000, 1) if burst else None,
+            "burst_s": round(duration, 2),
+            "throughput_msg_s": round(len(notes) / duration, 1) if duration else None,
+        },
+        "api_calls": api.summary(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--click-rate", type=float, default=100.0, help="callbacks pushed per second")
+    parser.add_argument("--click-timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=20.0)
+    parser.add_argument("--lead", type=float, default=10.0, help="seconds between subscribing and the fire")
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--digest-window", type=float, default=1.0, help="DIGEST_WINDOW for the bot")
+    add_config_arguments(parser)
+    report = asyncio.run(run(parser.parse_args()))
+    sys.stdout.write(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
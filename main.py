@@ -1,14 +1,26 @@
+import asyncio
 import logging
 import os
+from datetime import datetime
 
 from dotenv import load_dotenv
 from telegram.ext import Application, ApplicationBuilder
+from telegram.request import HTTPXRequest
 
 import list_db
+import metrics
 from admin_handlers import get_admin_handlers
+from broadcast_jobs import broadcasts
+from catch_up import catch_up
 from callback_handlers import get_callback_handlers
-from di import time_trigger
+from di import shard_coordinator, storage, time_trigger, write_behind
+from digest import digests
+from event_catalog import catalog
 from models import Event, TimeSlot
+from outbox import outbox
+from request_lanes import BULK, INTERACTIVE, LaneRequest, PriorityGate
+from staging import stager
+from update_processor import PerUserUpdateProcessor
 from user_interactions import get_command_handlers
 
 load_dotenv()
@@ -16,6 +28,24 @@ load_dotenv()
 TOKEN: str = os.environ["BOT_TOKEN"]
 ADMIN_ID: int = int(os.environ["ADMIN_ID"])
 
+# "polling" (default) or "webhook". Webhook mode serves updates from a local
+# HTTP server and keeps updates queued by Telegram while the bot was down.
+BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+
+# Outgoing Bot API calls: user-facing ones and bulk fan-outs get their own
+# connection pools and timeouts, and share OUTGOING_CONCURRENCY in-flight
+# slots. Interactive calls go first; bulk is always allowed BULK_SHARE of them.
+INTERACTIVE_POOL_SIZE: int = int(os.getenv("INTERACTIVE_POOL_SIZE", "64"))
+INTERACTIVE_TIMEOUT: float = float(os.getenv("INTERACTIVE_TIMEOUT", "5"))
+BULK_POOL_SIZE: int = int(os.getenv("BULK_POOL_SIZE", "32"))
+BULK_TIMEOUT: float = float(os.getenv("BULK_TIMEOUT", "10"))
+OUTGOING_CONCURRENCY: int = int(os.getenv("OUTGOING_CONCURRENCY", "64"))
+BULK_SHARE: float = float(os.getenv("BULK_SHARE", "0.5"))
+
+# Prometheus endpoint (GET /metrics); 0 disables it.
+METRICS_LISTEN: str = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+
 logging.basicConfig(
     format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     level=logging.INFO,
@@ -26,29 +56,41 @@ logger = logging.getLogger(__name__)
 # ── notification callback used by the scheduler ────────────────────────────────
 
 
-async def notify_subscribers(event: Event, slot: TimeSlot) -> None:
-    """Invoked by APSchedulerTimeTrigger when a scheduled time-slot fires."""
-    bot = application.bot
-    text = f"🔔 *{event.name}*\n🕐 {slot.time}\n📝 {slot.description}"
-    for telegram_id in event.subscriber_telegram_ids:
-        try:
-            await bot.send_message(telegram_id, text, parse_mode="Markdown")
-        except Exception as exc:
-            logger.warning("Could not notify user %s: %s", telegram_id, exc)
+async def notify_subscribers(event: Event, slot: TimeSlot, at: datetime) -> None:
+    """Invoked by the trigger engine when *slot* of *event*, scheduled for *at*, fires."""
+    metrics.FIRE_LAG_SECONDS.observe(max(0.0, (datetime.now() - at).total_seconds()))
+    stats = await digests.fire(application.bot, event, slot, at)
+    if stats is None:
+        return
+    logger.info("Fired %s @ %s: %s", event.id, slot.time, stats.summary())
 
 
 # ── lifecycle hooks ────────────────────────────────────────────────────────────
 
 
 async def post_init(app: Application) -> None:
-    """Start scheduler and load all events once the event-loop is running."""
-    from time_trigger import APSchedulerTimeTrigger
-
-    if isinstance(time_trigger, APSchedulerTimeTrigger):
-        time_trigger.start()
-
-    await time_trigger.import_triggers(list_db.events, notify_subscribers)
+    """Warm the cache, start scheduler and load all events once the event-loop is running."""
+    await storage.open()
+    last_fire = await storage.load_last_fire()
+    await list_db.load(storage)
+    write_behind.start()
+    logger.info("Loaded %d user(s) from storage.", len(list_db.users))
+    if shard_coordinator is not None:
+        shard_coordinator.start(TOKEN)
+    await broadcasts.load(app.bot)
+    await outbox.load(app.bot)
+
+    time_trigger.start()
+    await catalog.load(notify_subscribers)
+    catalog.watch()
+    stager.start()
     logger.info("Registered %d event trigger(s).", len(list_db.events))
+    if METRICS_PORT:
+        app.bot_data["metrics_server"] = await metrics.start_server(METRICS_LISTEN, METRICS_PORT)
+    # Not app.create_task: the Application isn't running yet and would not track it.
+    app.bot_data["catch_up"] = asyncio.get_running_loop().create_task(
+        catch_up(app.bot, outbox, list(list_db.events), last_fire, datetime.now())
+    )
 
     try:
         await app.bot.send_message(ADMIN_ID, "✅ Bot is activated 🚀")
@@ -56,9 +98,33 @@ async def post_init(app: Application) -> None:
         logger.error("Admin startup notification failed: %s", exc)
 
 
-async def post_shutdown(app: Application) -> None:
-    """Gracefully remove all triggers and notify admin."""
+async def post_stop(app: Application) -> None:
+    """Remove all triggers, then let catch-up, broadcasts and outbox batches wind down while the bot can still send."""
+    await catalog.stop()
+    await stager.stop()
     await time_trigger.remove_all_triggers()
+    task = app.bot_data.pop("catch_up", None)
+    if task is not None:
+        # Same grace as a broadcast gets, then cancel it before the outbox and storage go away.
+        _, pending = await asyncio.wait({task}, timeout=30.0)
+        for t in pending:
+            t.cancel()
+        for result in await asyncio.gather(task, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error("Catch-up failed: %r", result)
+    await asyncio.gather(broadcasts.shutdown(), outbox.shutdown())
+    if shard_coordinator is not None:
+        await shard_coordinator.stop()
+
+
+async def post_shutdown(app: Application) -> None:
+    """Close the metrics server, flush pending writes and notify admin."""
+    server = app.bot_data.pop("metrics_server", None)
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    await write_behind.stop()
+    await storage.close()
     try:
         await app.bot.send_message(ADMIN_ID, "💥 Bot is crashed / stopped 🛑")
     except Exception as exc:
@@ -67,11 +133,40 @@ async def post_shutdown(app: Application) -> None:
 
 # ── application setup ──────────────────────────────────────────────────────────
 
+outgoing_gate = PriorityGate(OUTGOING_CONCURRENCY, BULK_SHARE)
+
 application: Application = (
     ApplicationBuilder()
     .token(TOKEN)
+    .base_url(os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot"))
+    .request(
+        LaneRequest(
+            interactive=HTTPXRequest(
+                connection_pool_size=INTERACTIVE_POOL_SIZE,
+                read_timeout=INTERACTIVE_TIMEOUT,
+                write_timeout=INTERACTIVE_TIMEOUT,
+                connect_timeout=INTERACTIVE_TIMEOUT,
+            ),
+            # Bulk calls already queue in the gate, so they may also wait for a connection.
+            bulk=HTTPXRequest(
+                connection_pool_size=BULK_POOL_SIZE,
+                read_timeout=BULK_TIMEOUT,
+                write_timeout=BULK_TIMEOUT,
+                connect_timeout=BULK_TIMEOUT,
+                pool_timeout=BULK_TIMEOUT,
+            ),
+            gate=outgoing_gate,
+        )
+    )
     .post_init(post_init)
+    .post_stop(post_stop)
     .post_shutdown(post_shutdown)
+    .concurrent_updates(
+        PerUserUpdateProcessor(
+            max_concurrent_updates=int(os.getenv("UPDATE_CONCURRENCY", "64")),
+            max_pending_updates=int(os.getenv("UPDATE_MAX_PENDING", "1024")),
+        )
+    )
     .build()
 )
 
@@ -84,9 +179,46 @@ for handler in get_admin_handlers():
 for handler in get_callback_handlers():
     application.add_handler(handler)
 
+metrics.registry.gauge("ntfly_users", "Registered users.", lambda: len(list_db.users))
+metrics.registry.gauge("ntfly_events", "Events in the catalog.", lambda: len(list_db.events))
+metrics.registry.gauge("ntfly_subscriptions", "Event subscriptions.", list_db.subscriptions.count)
+metrics.registry.gauge("ntfly_write_behind_depth", "Storage ops waiting to be flushed.", lambda: len(write_behind))
+metrics.registry.gauge("ntfly_outbox_active", "Outbox batches being delivered.", lambda: len(outbox))
+metrics.registry.gauge("ntfly_digest_pending", "Fires waiting to be released with their group.", digests.pending)
+metrics.registry.gauge("ntfly_outbox_staged", "Outbox batches staged ahead of their fire.", outbox.staged_count)
+metrics.registry.gauge(
+    "ntfly_update_queue_depth", "Updates fetched but not yet dispatched.", application.update_queue.qsize
+)
+metrics.registry.gauge(
+    "ntfly_interactive_waiting", "User-facing API calls waiting for a slot.", lambda: outgoing_gate.waiting(INTERACTIVE)
+)
+metrics.registry.gauge(
+    "ntfly_bulk_waiting", "Bulk API calls waiting for a slot.", lambda: outgoing_gate.waiting(BULK)
+)
+
 
 # ── entry point ────────────────────────────────────────────────────────────────
 
+def run_webhook() -> None:
+    listen = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    port = int(os.getenv("WEBHOOK_PORT", "8443"))
+    url_path = os.getenv("WEBHOOK_PATH", "telegram")
+    logger.info("Starting webhook server on %s:%d/%s…", listen, port, url_path)
+    application.run_webhook(
+        listen=listen,
+        port=port,
+        url_path=url_path,
+        webhook_url=os.getenv("WEBHOOK_URL"),
+        # Telegram echoes this in X-Telegram-Bot-Api-Secret-Token; other requests get 403.
+        secret_token=os.environ["WEBHOOK_SECRET"],
+        max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+        drop_pending_updates=False,
+    )
+
+
 if __name__ == "__main__":
-    logger.info("Starting bot polling…")
-    application.run_polling(drop_pending_updates=True)
+    if BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        logger.info("Starting bot polling…")
+        application.run_polling(drop_pending_updates=True)
@@ -0,0 +1,94 @@
+import logging
+import os
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from telegram import CallbackQuery, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, TelegramError
+
+from delivery import retry_once
+
+logger = logging.getLogger(__name__)
+
+
+def _fingerprint(
+    text: str, parse_mode: Optional[str], reply_markup: Optional[InlineKeyboardMarkup]
+) -> int:
+    # InlineKeyboardMarkup hashes by its buttons, so equal keyboards collide on purpose.
+    return hash((text, parse_mode, reply_markup))
+
+
+def _query_key(query: CallbackQuery) -> Hashable:
+    if query.message is not None:
+        return (query.message.chat.id, query.message.message_id)
+    return query.inline_message_id
+
+
+class MessageStateCache:
+    """Remembers what each bot message currently shows, to skip no-op edits.
+
+    Stores one fingerprint of (text, parse_mode, reply_markup) per
+    ``(chat_id, message_id)``, in an LRU bounded to *max_entries*. An edit
+    whose fingerprint matches is never sent, saving the round trip and the
+    "message is not modified" error.
+    """
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self._max_entries = max_entries
+        self._states: "OrderedDict[Hashable, int]" = OrderedDict()
+        self.skipped = 0
+
+    def _store(self, key: Hashable, fingerprint: int) -> None:
+        self._states[key] = fingerprint
+        self._states.move_to_end(key)
+        if len(self._states) > self._max_entries:
+            self._states.popitem(last=False)
+
+    def remember(
+        self,
+        message: Message,
+        text: str,
+        parse_mode: Optional[str] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ) -> None:
+        """Record a message the bot just sent, so its first edit can be diffed too."""
+        self._store((message.chat.id, message.message_id), _fingerprint(text, parse_mode, reply_markup))
+
+    def forget(self, query: CallbackQuery) -> None:
+        self._states.pop(_query_key(query), None)
+
+    async def edit(
+        self,
+        query: CallbackQuery,
+        text: str,
+        parse_mode: Optional[str] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ) -> bool:
+        """Edit the query's message unless it already shows this. Returns whether it was sent.
+
+        A 429 is waited out and retried once; any Telegram error left after
+        that is logged and the edit dropped, never raised to the caller.
+        """
+        key = _query_key(query)
+        fingerprint = _fingerprint(text, parse_mode, reply_markup)
+        if self._states.get(key) == fingerprint:
+            self._states.move_to_end(key)
+            self.skipped += 1
+            return False
+        try:
+            await retry_once(
+                lambda: query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+            )
+        except BadRequest as exc:
+            if "not modified" not in exc.message.lower():
+                logger.warning("Could not edit %s: %s", key, exc)
+                return False
+            logger.debug("Edit of %s was a no-op.", key)
+        except TelegramError as exc:
+            logger.warning("Could not edit %s: %s", key, exc)
+            return False
+        self._store(key, fingerprint)
+        return True
+
+
+message_state = MessageStateCache(int(os.getenv("MESSAGE_STATE_SIZE", "100000")))
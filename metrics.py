@@ -0,0 +1,266 @@
+import asyncio
+import bisect
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+if TYPE_CHECKING:
+    from delivery import DeliveryStats
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a fast local call to a long fan-out.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+Labels = Tuple[str, ...]
+# One histogram series in transit: (bucket counts, sum, count).
+SeriesData = Tuple[List[int], float, int]
+M = TypeVar("M", bound="_Metric")
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Lines of the exposition format, without the HELP/TYPE header."""
+        ...
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for values, total in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}"
+
+
+class Gauge(_Metric):
+    """A value read from *func* at scrape time, so nothing has to keep it updated."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, func: Callable[[], float]) -> None:
+        super().__init__(name, help_text)
+        self._func = func
+
+    def get(self) -> float:
+        return float(self._func())
+
+    def samples(self) -> Iterator[str]:
+        try:
+            yield f"{self.name} {_format_value(self.get())}"
+        except Exception as exc:
+            logger.warning("Gauge %s failed: %s", self.name, exc)
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self._buckets = tuple(buckets) + (math.inf,)
+        self._series: Dict[Labels, _Series] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = _Series(len(self._buckets))
+        series.counts[bisect.bisect_left(self._buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series.count if series else 0
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Upper bound of the bucket holding the *q*-quantile (what a dashboard would show)."""
+        series = self._series.get(label_values)
+        if not series or not series.count:
+            return None
+        rank = q * series.count
+        seen = 0
+        for bound, n in zip(self._buckets, series.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def label_sets(self) -> List[Labels]:
+        return sorted(self._series)
+
+    def drain(self) -> Dict[Labels, SeriesData]:
+        """Return every series and reset them, to ship observations to another process."""
+        drained = {v: (s.counts, s.sum, s.count) for v, s in self._series.items()}
+        self._series = {}
+        return drained
+
+    def merge(self, data: Dict[Labels, SeriesData]) -> None:
+        """Add series returned by :meth:`drain` of a histogram with the same buckets."""
+        for values, (counts, total, count) in data.items():
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = _Series(len(self._buckets))
+            series.counts = [a + b for a, b in zip(series.counts, counts)]
+            series.sum += total
+            series.count += count
+
+    def samples(self) -> Iterator[str]:
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self._buckets, series.counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}"
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_format_value(series.sum)}"
+            yield f"{self.name}_count{labels} {series.count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float]) -> Gauge:
+        """Register (or replace) a gauge computed by *func* on every scrape."""
+        return self.register(Gauge(name, help_text, func))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        return "".join(m.render() for m in self._metrics.values())
+
+
+registry = Registry()
+
+# ── instruments ────────────────────────────────────────────────────────────────
+
+SENDS = registry.register(Counter(
+    "ntfly_sends_total", "Outcome of every message send attempt.", ["outcome"]
+))
+SENDS_SKIPPED = registry.register(Counter(
+    "ntfly_sends_skipped_total", "Sends not attempted because the recipient is inactive."
+))
+DEACTIVATIONS = registry.register(Counter(
+    "ntfly_deactivations_total", "Users marked inactive after a permanent delivery error."
+))
+SEND_SECONDS = registry.register(Histogram(
+    "ntfly_send_seconds", "Duration of one sendMessage call."
+))
+FANOUT_SECONDS = registry.register(Histogram(
+    "ntfly_fanout_seconds", "Duration of one fan-out (notification or broadcast chunk)."
+))
+FIRE_LAG_SECONDS = registry.register(Histogram(
+    "ntfly_fire_lag_seconds", "How late a scheduled fire started compared to its slot time."
+))
+CALLBACK_SECONDS = registry.register(Histogram(
+    "ntfly_callback_seconds", "Callback handler duration per action.", ["action"]
+))
+
+
+def observe_fanout(stats: "DeliveryStats") -> None:
+    """Fold one fan-out's :class:`delivery.DeliveryStats` into the counters."""
+    FANOUT_SECONDS.observe(stats.duration)
+    SENDS.inc("sent", amount=stats.sent)
+    SENDS.inc("failed", amount=stats.failed)
+    SENDS.inc("retried", amount=stats.retried)
+    SENDS.inc("rate_limited", amount=stats.rate_limited)
+
+
+# ── HTTP endpoint ──────────────────────────────────────────────────────────────
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode(errors="replace").split(" ")
+        path = parts[1].split("?")[0] if len(parts) > 2 else ""
+        if path == "/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(host: str, port: int) -> asyncio.AbstractServer:
+    """Serve ``GET /metrics`` on *host*:*port*."""
+    server = await asyncio.start_server(_serve, host, port)
+    logger.info("Metrics on http://%s:%d/metrics", host, port)
+    return server
@@ -1,10 +1,12 @@
 from dataclasses import dataclass, field
 from datetime import date
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
 class TimeSlot:
+    __slots__ = ("time", "description")
+
     time: str  # "HH:MM" 24-hour format
     description: str
 
@@ -29,10 +31,39 @@ class Event:
     till_date: date
     top_week: WeekSchedule
     bottom_week: WeekSchedule
-    subscriber_telegram_ids: List[int] = field(default_factory=list)
+    # What to do with fires missed while the bot was down: skip | grace | coalesce.
+    misfire_policy: str = "grace"
+    misfire_grace: int = 900  # seconds after its time a missed fire is still sent
 
 
 @dataclass
 class User:
+    __slots__ = ("id", "telegram_id")
+
     id: int
     telegram_id: int
+
+
+@dataclass
+class BroadcastJob:
+    id: int
+    text: str
+    target_user_id: int  # users registered after the job started are not included
+    total: int
+    cursor: int = 0  # highest User.id already delivered to
+    sent: int = 0
+    failed: int = 0
+    status: str = "running"  # running | done | cancelled
+    started_at: float = 0.0
+    finished_at: Optional[float] = None
+
+
+@dataclass
+class OutboxBatch:
+    id: str  # "<event_id>@<YYYY-MM-DD>T<HH:MM>": one batch per scheduled fire
+    event_id: int
+    text: str
+    entities: str  # JSON list of MessageEntity dicts
+    status: str = "pending"  # staged | pending | done
+    created_at: float = 0.0
+    finished_at: Optional[float] = None
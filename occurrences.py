@@ -0,0 +1,152 @@
+import heapq
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import islice, takewhile
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from models import Event, TimeSlot
+
+_DAY_FIELDS: Tuple[str, ...] = (
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+)
+
+
+def is_top_week(day: date) -> bool:
+    """Odd ISO-week numbers are treated as 'top', even as 'bottom'."""
+    return day.isocalendar()[1] % 2 != 0
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    """One concrete firing of a slot: *slot* of event *event_id* at *at*."""
+
+    at: datetime
+    event_id: int
+    slot: TimeSlot
+    is_top: bool
+
+
+def _slot_time(slot: TimeSlot) -> time:
+    hour, minute = map(int, slot.time.split(":"))
+    return time(hour, minute)
+
+
+def expand(event: Event, after: datetime) -> Iterator[Occurrence]:
+    """Yield every occurrence of *event* strictly after *after*, in time order.
+
+    Honours the event's date range and picks the top or bottom
+    :class:`WeekSchedule` by ISO-week parity of each day.
+    """
+    day = max(after.date(), event.from_date)
+    while day <= event.till_date:
+        top = is_top_week(day)
+        week = event.top_week if top else event.bottom_week
+        slots = sorted(getattr(week, _DAY_FIELDS[day.weekday()]), key=lambda s: s.time)
+        for slot in slots:
+            at = datetime.combine(day, _slot_time(slot))
+            if at > after:
+                yield Occurrence(at, event.id, slot, top)
+        day += timedelta(days=1)
+
+
+def slots_at(event: Event, at: datetime) -> List[TimeSlot]:
+    """Every slot of *event* due exactly at *at*, in schedule order."""
+    candidates = takewhile(lambda o: o.at <= at, expand(event, at - timedelta(minutes=1)))
+    return [o.slot for o in candidates if o.at == at]
+
+
+@dataclass
+class _Window:
+    start: datetime
+    end: datetime
+    items: List[Occurrence]
+
+
+class OccurrenceIndex:
+    """Cache of concrete fire datetimes per event.
+
+    Each event keeps a window of expanded occurrences, *horizon* long, that is
+    rebuilt lazily when a query falls outside it. :meth:`update` and
+    :meth:`discard` only invalidate the one event they touch.
+    """
+
+    def __init__(self, horizon: timedelta = timedelta(days=14)) -> None:
+        self._horizon = horizon
+        self._events: Dict[Union[int, str], Event] = {}
+        self._windows: Dict[Union[int, str], _Window] = {}
+
+    # ── registration ───────────────────────────────────────────────────────────
+
+    def update(self, event: Event) -> None:
+        """Register *event*, or drop its cached occurrences after a change."""
+        self._events[event.id] = event
+        self._windows.pop(event.id, None)
+
+    def discard(self, event_id: Union[int, str]) -> None:
+        self._events.pop(event_id, None)
+        self._windows.pop(event_id, None)
+
+    def clear(self) -> None:
+        self._events.clear()
+        self._windows.clear()
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    def _window(self, event: Event, start: datetime, end: datetime) -> _Window:
+        """The cached window of *event*, rebuilt from *start* if it doesn't cover ``(start, end]``."""
+        window = self._windows.get(event.id)
+        if window is None or start < window.start or end > window.end:
+            window_end = max(end, start + self._horizon)
+            items: List[Occurrence] = []
+            for occurrence in expand(event, start):
+                if occurrence.at > window_end:
+                    break
+                items.append(occurrence)
+            window = _Window(start, window_end, items)
+            self._windows[event.id] = window
+        return window
+
+    def _between(self, event_id: Union[int, str], start: datetime, end: datetime) -> List[Occurrence]:
+        """Occurrences of *event_id* with ``start < at <= end``."""
+        event = self._events.get(event_id)
+        if event is None:
+            return []
+        window = self._window(event, start, end)
+        return [o for o in window.items if start < o.at <= end]
+
+    # ── queries ────────────────────────────────────────────────────────────────
+
+    def upcoming(self, event_id: Union[int, str], n: int, after: Optional[datetime] = None) -> List[Occurrence]:
+        """The next *n* occurrences of *event_id* after *after* (default: now)."""
+        after = after or datetime.now()
+        event = self._events.get(event_id)
+        if event is None:
+            return []
+        # Any window starting at or before *after* will do while it still holds n occurrences.
+        window = self._window(event, after, after)
+        i = bisect_right(window.items, after, key=lambda o: o.at)
+        if len(window.items) - i < n and window.end < after + self._horizon:
+            window = self._window(event, after, after + self._horizon)
+            i = bisect_right(window.items, after, key=lambda o: o.at)
+        found = window.items[i:i + n]
+        if len(found) >= n:
+            return found
+        # Sparse schedule: fall back to a direct walk instead of growing the window.
+        return list(islice(expand(event, after), n))
+
+    def next_batch(self, event_id: Union[int, str], after: datetime) -> List[Occurrence]:
+        """All occurrences of *event_id* sharing the first fire time after *after*."""
+        first = self.upcoming(event_id, 1, after)
+        if not first:
+            return []
+        return self._between(event_id, after, first[0].at)
+
+    def next_fires(self, window: timedelta, after: Optional[datetime] = None) -> List[Occurrence]:
+        """Every occurrence of every event in ``(after, after + window]``, in time order."""
+        after = after or datetime.now()
+        end = after + window
+        return list(heapq.merge(
+            *(self._between(event_id, after, end) for event_id in self._events),
+            key=lambda o: o.at,
+        ))
@@ -0,0 +1,478 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import astuple, dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from telegram import Bot, MessageEntity
+
+import list_db
+from delivery import DeliveryStats, Sender
+from di import payloads, sender, storage, write_behind
+from metrics import SENDS_SKIPPED, observe_fanout
+from models import Event, OutboxBatch, TimeSlot
+from occurrences import slots_at
+from payloads import CompiledPayload, join, utf16_len
+from storage_abs import StorageAbs, StorageOp
+from subscription_index import ChangeLog
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# Finished batches are kept this long so a repeated fire of the same slot is recognised.
+_KEEP_DONE = 7 * 24 * 3600
+
+# Telegram rejects longer messages; a digest that would exceed it is not built.
+MAX_MESSAGE_LENGTH = 4096
+
+
+def batch_id(event_id: int, slot: TimeSlot, day: date) -> str:
+    return f"{event_id}@{day.isoformat()}T{slot.time}"
+
+
+def digest_id(event_ids: Sequence[int], at: datetime) -> str:
+    """Batch id of the digest combining *event_ids* fired at *at*, e.g. ``"1+4@2025-09-02T09:00"``."""
+    return f"{'+'.join(map(str, event_ids))}@{at:%Y-%m-%dT%H:%M}"
+
+
+def digest_header(at: datetime) -> str:
+    return f"📬 Due at {at:%H:%M}:\n\n"
+
+
+def _entities_json(payload: CompiledPayload) -> str:
+    return json.dumps([e.to_dict() for e in payload.entities])
+
+
+def _slots_due(event: Event, slot: TimeSlot, at: datetime) -> List[TimeSlot]:
+    # Every slot of the event at that minute shares the batch, whichever of them fired.
+    slots = slots_at(event, at)
+    return slots if slot in slots else [slot]
+
+
+def _payload(event: Event, slots: Sequence[TimeSlot]) -> CompiledPayload:
+    # Slots of one event due at the same minute share a batch, so they go out as one message.
+    if len(slots) == 1:
+        return payloads.get(event, slots[0])
+    return join([payloads.get(event, slot) for slot in slots])
+
+
+@dataclass
+class _Staged:
+    """A batch written ahead of its fire, waiting for the trigger."""
+
+    batch: OutboxBatch
+    at: datetime
+    members: Sequence[int]  # the subscriber snapshot, sorted
+    recipients: Sequence[int]  # the same ids in release order
+    order: Callable[[Sequence[int]], Sequence[int]]  # what put them in that order
+    changes: ChangeLog  # fan-out changes since the snapshot
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    written: bool = False
+
+    def settle(self) -> Tuple[Sequence[int], List[StorageOp]]:
+        """Recipients with the recorded changes applied, and the ops that persist them."""
+        latest: Dict[int, bool] = {}
+        for telegram_id, joined in self.changes:
+            latest[telegram_id] = joined
+        if not latest:
+            return self.recipients, []
+
+        def had(telegram_id: int) -> bool:
+            i = bisect_left(self.members, telegram_id)
+            return i < len(self.members) and self.members[i] == telegram_id
+
+        joined = [tid for tid, on in latest.items() if on and not had(tid)]
+        left = {tid for tid, on in latest.items() if not on and had(tid)}
+        if joined:
+            # Order the whole set again so joiners land where the order puts them, VIPs included.
+            kept = (tid for tid in self.members if tid not in left)
+            recipients = self.order(list(heapq.merge(kept, sorted(joined))))
+        else:
+            recipients = array("q", (tid for tid in self.recipients if tid not in left))
+        key = self.batch.id
+        return recipients, (
+            [("outbox_recipient", (key, tid)) for tid in joined]
+            + [("outbox_delivered", (key, tid)) for tid in left]
+        )
+
+
+@dataclass
+class _Fire:
+    """A batch about to be released, claimed from staging or built on the spot."""
+
+    batch: OutboxBatch
+    payload: CompiledPayload
+    recipients: Sequence[int]
+    ops: List[StorageOp] = field(default_factory=list)  # pending changes to a staged batch
+    staged: bool = False
+
+    def exclude(self, telegram_ids: Set[int]) -> None:
+        """Take *telegram_ids* out of this batch."""
+        if self.staged:
+            key = self.batch.id
+            self.ops += [("outbox_delivered", (key, tid)) for tid in self.recipients if tid in telegram_ids]
+        self.recipients = array("q", (tid for tid in self.recipients if tid not in telegram_ids))
+
+    def write_ops(self) -> List[StorageOp]:
+        key = self.batch.id
+        if self.staged:
+            return self.ops + [("outbox_release", (key,))]
+        return [("outbox_add", astuple(self.batch))] + [("outbox_recipient", (key, tid)) for tid in self.recipients]
+
+
+class Outbox:
+    """Makes every scheduled fire durable before anything is sent.
+
+    A fire becomes an :class:`OutboxBatch` plus one row per recipient, written
+    straight to storage. Delivered recipients are removed from the batch
+    through the write-behind queue, i.e. in bulk, and the batch is closed once
+    the fan-out returns. A batch still pending at startup is resumed for the
+    recipients it has left, so a crash re-sends at most the few deliveries
+    not yet flushed instead of dropping everyone after the crash point.
+
+    A fire can also be staged ahead of time (see :mod:`staging`): the batch
+    and its recipients are written with status ``staged``, and the fire
+    itself then only folds in the subscription changes made since and
+    flips the batch to ``pending``. Staged batches are discarded at startup.
+
+    With a *window* of N seconds, each batch is handed to the engine in N
+    slices, one per second, instead of all at once.
+
+    Fires due at the same time can be released together (:meth:`fire_group`):
+    a user who would get several of them gets one digest message per
+    combination instead, unless they opted out.
+    """
+
+    def __init__(
+        self, engine: Sender, store: StorageAbs, queue: WriteBehindQueue, window: float = 0.0
+    ) -> None:
+        self._engine = engine
+        self._store = store
+        self._queue = queue
+        self._window = window
+        self._active: Dict[str, asyncio.Task] = {}
+        # Batches a fire has claimed but not spawned yet.
+        self._reserved: Set[str] = set()
+        self._staged: Dict[str, _Staged] = {}
+
+    def __len__(self) -> int:
+        """Batches currently being delivered."""
+        return len(self._active)
+
+    def staged_count(self) -> int:
+        return len(self._staged)
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    async def _deliver(self, bot: Bot, recipients: Sequence[int], text: str, **kwargs: Any) -> DeliveryStats:
+        slices = min(len(recipients), int(self._window))
+        if slices < 2:
+            return await self._engine.deliver(bot, recipients, text, **kwargs)
+        size = -(-len(recipients) // slices)
+        started = time.monotonic()
+
+        async def release(i: int) -> DeliveryStats:
+            await asyncio.sleep(i * self._window / slices)
+            part = recipients[i * size:(i + 1) * size]
+            return await self._engine.deliver(bot, part, text, observe=False, **kwargs)
+
+        stats = DeliveryStats()
+        for part in await asyncio.gather(*(release(i) for i in range(slices))):
+            stats.merge(part)
+        stats.duration = time.monotonic() - started
+        # The slices are one fan-out; observe them as such.
+        observe_fanout(stats)
+        return stats
+
+    async def _drain(self, bot: Bot, batch: OutboxBatch, recipients: Sequence[int]) -> DeliveryStats:
+        stats = await self._deliver(
+            bot,
+            recipients,
+            batch.text,
+            on_sent=lambda tid: self._queue.put("outbox_delivered", batch.id, tid),
+            entities=MessageEntity.de_list(json.loads(batch.entities), None),
+        )
+        list_db.deactivate(stats.unreachable)
+        # Recipients left at this point failed for good; don't retry them on restart.
+        batch.status = "done"
+        batch.finished_at = time.time()
+        await self._store.apply([
+            ("outbox_clear", (batch.id,)),
+            ("outbox_done", (batch.finished_at, batch.id)),
+        ])
+        return stats
+
+    def _spawn(self, bot: Bot, batch: OutboxBatch, recipients: Sequence[int]) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._drain(bot, batch, recipients))
+        self._active[batch.id] = task
+        task.add_done_callback(lambda _: self._active.pop(batch.id, None))
+        return task
+
+    async def _drop(self, staged: _Staged) -> None:
+        list_db.subscriptions.unwatch(staged.batch.event_id, staged.changes)
+        if staged.written:
+            await self._store.apply([
+                ("outbox_clear", (staged.batch.id,)),
+                ("outbox_drop", (staged.batch.id,)),
+            ])
+
+    def _new_fire(self, key: str, event_id: int, payload: CompiledPayload, recipients: Sequence[int]) -> _Fire:
+        batch = OutboxBatch(
+            id=key,
+            event_id=event_id,
+            text=payload.text,
+            entities=_entities_json(payload),
+            created_at=time.time(),
+        )
+        return _Fire(batch, payload, recipients)
+
+    def _reserve(self, key: str) -> bool:
+        """Claim batch *key* for the calling fire; ``False`` if another one in this process has it."""
+        if key in self._active or key in self._reserved:
+            logger.info("Outbox batch %s is already being delivered.", key)
+            return False
+        self._reserved.add(key)
+        return True
+
+    async def _stored(self, key: str) -> bool:
+        if await self._store.outbox_status(key) in ("pending", "done"):
+            logger.info("Outbox batch %s was already sent.", key)
+            return True
+        return False
+
+    async def _prepare(self, key: str, event: Event, slots: Sequence[TimeSlot], at: datetime) -> Optional[_Fire]:
+        """Batch *key* for *slots* of *event* at *at*, taken from staging if still current."""
+        if await self._stored(key):
+            return None
+        payload = _payload(event, slots)
+        SENDS_SKIPPED.inc(amount=list_db.subscriptions.inactive_subscriber_count(event.id))
+        staged = self._staged.pop(key, None)
+        if staged is not None and await self._claim(staged, payload):
+            recipients, ops = staged.settle()
+            staged.batch.status = "pending"
+            return _Fire(staged.batch, payload, recipients, ops, staged=True)
+        return self._new_fire(key, event.id, payload, list_db.subscriptions.subscribers(event.id))
+
+    def _coalesce(self, fires: List[_Fire], at: datetime) -> List[_Fire]:
+        """Move users who get more than one of *fires* into one digest per combination."""
+        masks: Dict[int, int] = {}
+        for i, fire in enumerate(fires):
+            bit = 1 << i
+            for tid in fire.recipients:
+                masks[tid] = masks.get(tid, 0) | bit
+        combos: Dict[int, List[int]] = {}
+        for tid, mask in masks.items():
+            if mask & (mask - 1) and list_db.wants_digest(tid):
+                combos.setdefault(mask, []).append(tid)
+
+        digests: List[_Fire] = []
+        moved: Set[int] = set()
+        for mask, tids in combos.items():
+            parts = [fire for i, fire in enumerate(fires) if mask >> i & 1]
+            payload = join([p.payload for p in parts], header=digest_header(at))
+            if utf16_len(payload.text) > MAX_MESSAGE_LENGTH:
+                continue
+            key = digest_id([p.batch.event_id for p in parts], at)
+            digests.append(self._new_fire(key, 0, payload, array("q", tids)))
+            moved.update(tids)
+        if moved:
+            for fire in fires:
+                fire.exclude(moved)
+        return digests
+
+    async def _launch(
+        self, bot: Bot, fires: List[_Fire], at: datetime, extra: Sequence[StorageOp] = ()
+    ) -> DeliveryStats:
+        """Commit *fires*, any *extra* ops and the last-fire mark in one transaction, then deliver them all."""
+        await self._store.apply(
+            [op for fire in fires for op in fire.write_ops()]
+            + list(extra)
+            + [("mark_fired", (at.isoformat(timespec="minutes"),))]
+        )
+        stats = DeliveryStats()
+        for part in await asyncio.gather(*(self._spawn(bot, f.batch, f.recipients) for f in fires)):
+            stats.merge(part)
+        return stats
+
+    async def _claim(self, staged: _Staged, payload: CompiledPayload) -> bool:
+        """Wait for *staged* to be written and check it still carries *payload*; drop it otherwise."""
+        await staged.ready.wait()
+        if staged.written and staged.batch.text == payload.text and staged.batch.entities == _entities_json(payload):
+            list_db.subscriptions.unwatch(staged.batch.event_id, staged.changes)
+            return True
+        await self._drop(staged)
+        return False
+
+    # ── public API ─────────────────────────────────────────────────────────────
+
+    async def seen(self, key: str) -> bool:
+        """Whether batch *key* is being delivered now or was sent by an earlier fire."""
+        return key in self._active or key in self._reserved or await self._stored(key)
+
+    async def send(
+        self,
+        bot: Bot,
+        key: str,
+        event_id: int,
+        payload: CompiledPayload,
+        at: datetime,
+        covers: Sequence[str] = (),
+    ) -> Optional[DeliveryStats]:
+        """Record batch *key* for the fire scheduled at *at*, then deliver it.
+
+        The batch, its recipients and the new last-fire mark are committed in
+        one transaction. *covers* are the keys of fires this batch stands in
+        for, e.g. the slots of a coalesced catch-up; they are recorded as sent
+        in that transaction too, so :meth:`seen` knows them. Returns ``None``
+        if this batch is being delivered or was already sent (a repeated fire
+        of the same slot).
+        """
+        if not self._reserve(key):
+            return None
+        try:
+            if await self._stored(key):
+                return None
+            SENDS_SKIPPED.inc(amount=list_db.subscriptions.inactive_subscriber_count(event_id))
+            fire = self._new_fire(key, event_id, payload, list_db.subscriptions.subscribers(event_id))
+            now = time.time()
+            # Empty, finished batches: nothing to send, only there to be found by seen().
+            markers = [("outbox_add", (k, event_id, "", "[]", "done", now, now)) for k in covers]
+            return await self._launch(bot, [fire], at, markers)
+        finally:
+            self._reserved.discard(key)
+
+    async def stage(
+        self,
+        event: Event,
+        slots: Sequence[TimeSlot],
+        at: datetime,
+        order: Callable[[Sequence[int]], Sequence[int]],
+    ) -> bool:
+        """Write the batch for *slots* of *event* at *at* ahead of time, recipients sorted by *order*.
+
+        Returns ``False`` if that batch is already staged, stored or due.
+        """
+        key = batch_id(event.id, slots[0], at.date())
+        if key in self._staged or key in self._active or key in self._reserved:
+            return False
+        if await self._store.outbox_status(key) is not None:
+            return False
+        if key in self._staged or key in self._active or key in self._reserved or at <= datetime.now():
+            return False
+        payload = _payload(event, slots)
+        members = list_db.subscriptions.subscribers(event.id)
+        staged = _Staged(
+            batch=OutboxBatch(
+                id=key,
+                event_id=event.id,
+                text=payload.text,
+                entities=_entities_json(payload),
+                status="staged",
+                created_at=time.time(),
+            ),
+            at=at,
+            members=members,
+            recipients=order(members),
+            order=order,
+            changes=list_db.subscriptions.watch(event.id),
+        )
+        self._staged[key] = staged
+        try:
+            await self._store.apply(
+                [("outbox_add", astuple(staged.batch))]
+                + [("outbox_recipient", (key, tid)) for tid in members]
+            )
+            staged.written = True
+        except Exception:
+            if self._staged.get(key) is staged:
+                del self._staged[key]
+                list_db.subscriptions.unwatch(event.id, staged.changes)
+            raise
+        finally:
+            staged.ready.set()
+        return True
+
+    async def expire(self, before: datetime) -> None:
+        """Forget staged batches due before *before* whose fire never came (event removed or moved)."""
+        for key, staged in list(self._staged.items()):
+            if staged.at < before and self._staged.get(key) is staged:
+                del self._staged[key]
+                await self._drop(staged)
+
+    async def fire(
+        self, bot: Bot, event: Event, slot: TimeSlot, at: datetime
+    ) -> Optional[DeliveryStats]:
+        """Deliver *slot* of *event* as scheduled at *at*; the batch key is taken from *at*.
+
+        Every other slot of *event* due at the same minute goes into the same
+        message, so their own fires find the batch already sent. Uses the
+        staged batch if there is one and it is still current.
+        """
+        return await self.fire_group(bot, [(event, slot)], at)
+
+    async def fire_group(
+        self, bot: Bot, fires: Sequence[Tuple[Event, TimeSlot]], at: datetime
+    ) -> Optional[DeliveryStats]:
+        """Deliver several (event, slot) *fires* all scheduled at *at*, with digests.
+
+        Returns the combined stats, or ``None`` if every batch was already sent or being sent.
+        """
+        by_event: Dict[int, Tuple[Event, List[TimeSlot]]] = {}
+        for event, slot in fires:
+            if event.id not in by_event:
+                by_event[event.id] = (event, _slots_due(event, slot, at))
+        prepared: List[_Fire] = []
+        reserved: List[str] = []
+        try:
+            for event, slots in by_event.values():
+                key = batch_id(event.id, slots[0], at.date())
+                if not self._reserve(key):
+                    continue
+                reserved.append(key)
+                fire = await self._prepare(key, event, slots, at)
+                if fire is not None:
+                    prepared.append(fire)
+            if not prepared:
+                return None
+            if len(prepared) > 1:
+                prepared += self._coalesce(prepared, at)
+            return await self._launch(bot, prepared, at)
+        finally:
+            self._reserved.difference_update(reserved)
+
+    async def mark(self, at: datetime) -> None:
+        """Record *at* as the latest processed fire without sending anything."""
+        await self._store.apply([("mark_fired", (at.isoformat(timespec="minutes"),))])
+
+    async def load(self, bot: Bot) -> None:
+        """Resume batches interrupted by the last shutdown. Called once in post_init."""
+        await self._store.apply([
+            ("outbox_prune", (time.time() - _KEEP_DONE,)),
+            ("outbox_clear_staged", ()),
+            ("outbox_drop_staged", ()),
+        ])
+        for batch, recipients in await self._store.load_outbox():
+            logger.info("Resuming outbox batch %s for %d recipient(s).", batch.id, len(recipients))
+            self._spawn(bot, batch, recipients)
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Give running batches *timeout* seconds; the rest resume on the next start."""
+        tasks = list(self._active.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Seconds over which each batch is released to the engine; 0 sends it all at once.
+DELIVERY_WINDOW: float = float(os.getenv("DELIVERY_WINDOW", "0"))
+
+outbox = Outbox(sender, storage, write_behind, window=DELIVERY_WINDOW)
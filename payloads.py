@@ -0,0 +1,186 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from telegram import MessageEntity
+
+from models import Event, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+# Legacy "Markdown" markers and the entity each one produces.
+_MARKERS: Dict[str, str] = {
+    "*": MessageEntity.BOLD,
+    "_": MessageEntity.ITALIC,
+    "`": MessageEntity.CODE,
+}
+_ESCAPABLE = "_*`["
+
+
+class MarkdownError(ValueError):
+    """Raised for a template Telegram would reject with "can't parse entities"."""
+
+
+def utf16_len(text: str) -> int:
+    # Telegram measures entity offsets in UTF-16 code units.
+    return len(text.encode("utf-16-le")) // 2
+
+
+@dataclass(frozen=True)
+class CompiledPayload:
+    """Ready-to-send message: plain text plus its formatting entities."""
+
+    text: str
+    entities: Tuple[MessageEntity, ...]
+
+
+class _Builder:
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._offset = 0
+        self.entities: List[MessageEntity] = []
+
+    def add(self, text: str, entity_type: Optional[str] = None, url: Optional[str] = None) -> None:
+        if not text:
+            return
+        length = utf16_len(text)
+        if entity_type is not None:
+            self.entities.append(MessageEntity(entity_type, self._offset, length, url=url))
+        self._parts.append(text)
+        self._offset += length
+
+    def add_payload(self, payload: CompiledPayload) -> None:
+        """Append an already compiled payload, shifting its entities into place."""
+        for e in payload.entities:
+            self.entities.append(MessageEntity(e.type, self._offset + e.offset, e.length, url=e.url))
+        self._parts.append(payload.text)
+        self._offset += utf16_len(payload.text)
+
+    def build(self) -> CompiledPayload:
+        return CompiledPayload("".join(self._parts), tuple(self.entities))
+
+
+def _add_markdown(builder: _Builder, source: str, strict: bool) -> None:
+    """Parse Telegram legacy Markdown from *source* into *builder*.
+
+    An unterminated marker raises :class:`MarkdownError` when *strict*,
+    otherwise it is kept as a literal character (auto-escaped).
+    """
+    literal: List[str] = []
+
+    def flush() -> None:
+        builder.add("".join(literal))
+        literal.clear()
+
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch == "\\" and i + 1 < n and source[i + 1] in _ESCAPABLE:
+            literal.append(source[i + 1])
+            i += 2
+            continue
+        if source.startswith("```", i):
+            close = source.find("```", i + 3)
+            if close != -1:
+                flush()
+                builder.add(source[i + 3:close].strip("\n"), MessageEntity.PRE)
+                i = close + 3
+                continue
+            ch = "```"
+        elif ch in _MARKERS:
+            close = source.find(ch, i + 1)
+            if close != -1:
+                flush()
+                builder.add(source[i + 1:close], _MARKERS[ch])
+                i = close + 1
+                continue
+        elif ch == "[":
+            label_end = source.find("](", i + 1)
+            url_end = source.find(")", label_end + 2) if label_end != -1 else -1
+            if url_end != -1:
+                flush()
+                builder.add(source[i + 1:label_end], MessageEntity.TEXT_LINK, source[label_end + 2:url_end])
+                i = url_end + 1
+                continue
+        else:
+            literal.append(ch)
+            i += 1
+            continue
+        if strict:
+            raise MarkdownError(f"Unterminated {ch!r} at position {i} in {source!r}")
+        literal.append(ch)
+        i += len(ch)
+    flush()
+
+
+def render(event: Event, slot: TimeSlot, strict: bool = False) -> CompiledPayload:
+    """Build the notification for one (event, slot).
+
+    Only the slot description is a Markdown template; the event name and time
+    are inserted as plain text, so they never need escaping.
+    """
+    builder = _Builder()
+    builder.add("🔔 ")
+    builder.add(event.name, MessageEntity.BOLD)
+    builder.add(f"\n🕐 {slot.time}\n📝 ")
+    _add_markdown(builder, slot.description, strict)
+    return builder.build()
+
+
+def join(parts: List[CompiledPayload], header: str = "", sep: str = "\n\n") -> CompiledPayload:
+    """Concatenate compiled payloads into one message, e.g. to coalesce several fires."""
+    builder = _Builder()
+    builder.add(header)
+    for i, part in enumerate(parts):
+        if i:
+            builder.add(sep)
+        builder.add_payload(part)
+    return builder.build()
+
+
+class PayloadCache:
+    """Notification payloads compiled once per (event, slot).
+
+    Trigger engines call :meth:`compile_event` when an event is registered, so
+    a broken template is reported (or auto-escaped) up front instead of on
+    every send. At fire time :meth:`get` is a dict lookup.
+    """
+
+    def __init__(self, strict: bool = False) -> None:
+        self._strict = strict
+        self._by_event: Dict[Union[int, str], Dict[Tuple[str, str], CompiledPayload]] = {}
+
+    def _compile(self, event: Event, slot: TimeSlot) -> CompiledPayload:
+        try:
+            return render(event, slot, strict=True)
+        except MarkdownError as exc:
+            if self._strict:
+                raise
+            logger.warning("Event %s @ %s: %s; sending it escaped.", event.id, slot.time, exc)
+            return render(event, slot, strict=False)
+
+    def compile_event(self, event: Event) -> None:
+        """(Re)compile every slot of *event*. Raises :class:`MarkdownError` in strict mode."""
+        compiled: Dict[Tuple[str, str], CompiledPayload] = {}
+        for week in (event.top_week, event.bottom_week):
+            for slots in vars(week).values():
+                for slot in slots:
+                    key = (slot.time, slot.description)
+                    if key not in compiled:
+                        compiled[key] = self._compile(event, slot)
+        self._by_event[event.id] = compiled
+
+    def discard(self, event_id: Union[int, str]) -> None:
+        self._by_event.pop(event_id, None)
+
+    def clear(self) -> None:
+        self._by_event.clear()
+
+    def get(self, event: Event, slot: TimeSlot) -> CompiledPayload:
+        """Compiled payload for (event, slot); slots never registered are compiled on demand."""
+        compiled = self._by_event.setdefault(event.id, {})
+        key = (slot.time, slot.description)
+        payload = compiled.get(key)
+        if payload is None:
+            payload = compiled[key] = self._compile(event, slot)
+        return payload
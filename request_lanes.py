@@ -0,0 +1,146 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from telegram._utils.types import ODVInput
+from telegram.request import BaseRequest, RequestData
+
+DEFAULT_NONE = BaseRequest.DEFAULT_NONE
+
+# Every outgoing Bot API call belongs to one lane. User-facing calls (answers,
+# edits, replies) are interactive; fan-outs mark themselves bulk with set_lane().
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+_lane: ContextVar[str] = ContextVar("request_lane", default=INTERACTIVE)
+
+
+def set_lane(lane: str) -> None:
+    """Route the calls made by the current task (and tasks it spawns) through *lane*."""
+    _lane.set(lane)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+class PriorityGate:
+    """In-flight limit shared by both lanes, with interactive calls served first.
+
+    At most *capacity* calls run at once. When a slot frees up it goes to a
+    waiting interactive call ahead of any bulk one, except that bulk is
+    always allowed *bulk_share* of the slots, so a fan-out keeps moving (at a
+    reduced pace) even under a flood of clicks. Bulk uses more than its share
+    only while no interactive call is waiting. Within a lane, callers are
+    served FIFO.
+    """
+
+    def __init__(self, capacity: int, bulk_share: float = 0.5) -> None:
+        if not 0 < bulk_share <= 1:
+            raise ValueError(f"bulk_share must be in (0, 1], got {bulk_share}")
+        self._capacity = capacity
+        self._bulk_reserved = max(1, int(capacity * bulk_share))
+        self._in_flight: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def _bulk_owed(self) -> bool:
+        return bool(self._waiters[BULK]) and self._in_flight[BULK] < self._bulk_reserved
+
+    def _has_room(self, lane: str) -> bool:
+        if sum(self._in_flight.values()) >= self._capacity:
+            return False
+        if lane == BULK:
+            return self._in_flight[BULK] < self._bulk_reserved or not self._waiters[INTERACTIVE]
+        return not self._bulk_owed()
+
+    def _wake(self) -> None:
+        while True:
+            if self._bulk_owed() and self._has_room(BULK):
+                lane = BULK
+            elif self._waiters[INTERACTIVE] and self._has_room(INTERACTIVE):
+                lane = INTERACTIVE
+            elif self._waiters[BULK] and self._has_room(BULK):
+                lane = BULK
+            else:
+                return
+            future = self._waiters[lane].popleft()
+            if not future.done():
+                self._in_flight[lane] += 1
+                future.set_result(None)
+
+    async def acquire(self, lane: str) -> None:
+        if not self._waiters[lane] and self._has_room(lane):
+            self._in_flight[lane] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(lane)  # granted just before the cancellation landed
+            elif future in self._waiters[lane]:
+                self._waiters[lane].remove(future)
+            raise
+
+    def release(self, lane: str) -> None:
+        self._in_flight[lane] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[None]:
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def waiting(self, lane: str) -> int:
+        return len(self._waiters[lane])
+
+
+class LaneRequest(BaseRequest):
+    """``BaseRequest`` that sends each call through its lane's own connection pool.
+
+    Pass one (typically ``HTTPXRequest``) backend per lane; a call goes to
+    the backend of :func:`current_lane` after taking a slot from *gate*.
+    """
+
+    def __init__(self, interactive: BaseRequest, bulk: BaseRequest, gate: PriorityGate) -> None:
+        self._backends: Dict[str, BaseRequest] = {INTERACTIVE: interactive, BULK: bulk}
+        self._gate = gate
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._backends[INTERACTIVE].read_timeout
+
+    async def initialize(self) -> None:
+        await asyncio.gather(*(b.initialize() for b in self._backends.values()))
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(*(b.shutdown() for b in self._backends.values()))
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: ODVInput[float] = DEFAULT_NONE,
+        write_timeout: ODVInput[float] = DEFAULT_NONE,
+        connect_timeout: ODVInput[float] = DEFAULT_NONE,
+        pool_timeout: ODVInput[float] = DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        lane = current_lane()
+        async with self._gate.slot(lane):
+            return await self._backends[lane].do_request(
+                url,
+                method,
+                request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
@@ -0,0 +1,317 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from delivery import DeliveryEngine, DeliveryStats, OnSent
+from metrics import SEND_SECONDS, observe_fanout
+
+logger = logging.getLogger(__name__)
+
+# Coordinator → worker: (task_id, chat_ids, text, send_kwargs), or None to stop.
+ShardTask = Tuple[int, List[int], str, Dict[str, Any]]
+# Worker → coordinator: (kind, shard, body), kind being "heartbeat" (body None),
+# "sent" ((task_id, chat_id), as each send succeeds) or "done"
+# ((task_id, DeliveryStats fields, drained send-latency histogram)).
+
+
+# ── worker process ─────────────────────────────────────────────────────────────
+
+
+async def _heartbeat(results: "multiprocessing.Queue", shard: int, interval: float) -> None:
+    while True:
+        results.put(("heartbeat", shard, None))
+        await asyncio.sleep(interval)
+
+
+async def _send(
+    bot: Bot, engine: DeliveryEngine, results: "multiprocessing.Queue", shard: int, task: ShardTask
+) -> None:
+    task_id, chat_ids, text, send_kwargs = task
+    sent = 0
+
+    def on_sent(chat_id: int) -> None:
+        nonlocal sent
+        sent += 1
+        results.put(("sent", shard, (task_id, chat_id)))
+
+    try:
+        stats = await engine.deliver(bot, chat_ids, text, on_sent=on_sent, **send_kwargs)
+    except Exception:
+        # The coordinator is waiting on this task; answer it whatever happened.
+        logger.exception("Delivery task %d failed", task_id)
+        stats = DeliveryStats(total=len(chat_ids), sent=sent, failed=len(chat_ids) - sent)
+    # Send latencies are observed here; ship them so the coordinator can expose them.
+    results.put(("done", shard, (task_id, asdict(stats), SEND_SECONDS.drain())))
+
+
+async def _serve(
+    shard: int,
+    token: str,
+    base_url: str,
+    rate: float,
+    concurrency: int,
+    tasks: "multiprocessing.Queue",
+    results: "multiprocessing.Queue",
+    heartbeat_interval: float,
+) -> None:
+    loop = asyncio.get_running_loop()
+    engine = DeliveryEngine(rate=rate, concurrency=concurrency)
+    running = set()
+    # One pooled connection per concurrent send; Bot's default pool holds a single one.
+    request = HTTPXRequest(connection_pool_size=concurrency, pool_timeout=30.0)
+    async with Bot(token, base_url=base_url, request=request) as bot:
+        beat = loop.create_task(_heartbeat(results, shard, heartbeat_interval))
+        while True:
+            task = await loop.run_in_executor(None, tasks.get)
+            if task is None:
+                break
+            job = loop.create_task(_send(bot, engine, results, shard, task))
+            running.add(job)
+            job.add_done_callback(running.discard)
+        await asyncio.gather(*running, return_exceptions=True)
+        beat.cancel()
+
+
+def _worker_main(shard: int, *args: Any) -> None:
+    """Entry point of a worker process: one bot, one engine, one shard of chats."""
+    logging.basicConfig(
+        format=f"%(asctime)s | %(levelname)s | shard-{shard} | %(name)s | %(message)s",
+        level=logging.INFO,
+    )
+    try:
+        asyncio.run(_serve(shard, *args))
+    except KeyboardInterrupt:
+        pass
+
+
+# ── coordinator ────────────────────────────────────────────────────────────────
+
+
+@dataclass
+class _Pending:
+    shard: int
+    task: ShardTask
+    future: asyncio.Future
+    on_sent: Optional[OnSent]
+    total: int = 0  # chats in the task as first queued
+    sent: Set[int] = field(default_factory=set)  # reported by a worker so far
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    tasks: "multiprocessing.Queue"
+    last_seen: float = field(default_factory=time.monotonic)
+    restarts: int = 0
+
+
+class ShardCoordinator:
+    """Fans notifications out across *shards* worker processes.
+
+    The coordinator (the bot process) keeps the scheduler, the handlers and
+    all state, subscriptions included. Workers hold no user data: each
+    fan-out is split by ``chat_id % shards`` and every part is shipped, chat
+    ids and all, over a ``multiprocessing`` queue to the worker for that
+    shard. Each worker has its own ``Bot`` and :class:`DeliveryEngine` at
+    ``rate / shards``, so HTTP, TLS and JSON work is spread over cores while
+    the global rate limit still holds.
+
+    Workers heartbeat every *heartbeat_interval* seconds. A worker that exits
+    or stays silent for *heartbeat_timeout* is killed and respawned, and every
+    task it had not finished is handed to the replacement, minus the chats
+    already reported sent. Workers report each send as it succeeds, so only
+    sends in flight when the worker died may be repeated. Once :meth:`stop` has begun, :meth:`deliver` refuses
+    new fan-outs.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        rate: float = 30.0,
+        concurrency: int = 16,
+        base_url: str = "https://api.telegram.org/bot",
+        heartbeat_interval: float = 2.0,
+        heartbeat_timeout: float = 10.0,
+    ) -> None:
+        self._token = ""
+        self._shards = shards
+        self._rate = rate / shards
+        self._concurrency = max(1, concurrency // shards)
+        self._base_url = base_url
+        self._heartbeat_interval = heartbeat_interval
+        self._heartbeat_timeout = heartbeat_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results: Optional["multiprocessing.Queue"] = None
+        self._workers: List[_Worker] = []
+        self._pending: Dict[int, _Pending] = {}
+        self._task_ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    def _spawn(self, shard: int) -> _Worker:
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                shard, self._token, self._base_url, self._rate, self._concurrency,
+                tasks, self._results, self._heartbeat_interval,
+            ),
+            name=f"ntfly-shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        logger.info("Started delivery shard %d (pid %s).", shard, process.pid)
+        return _Worker(process=process, tasks=tasks)
+
+    def _read_results(self) -> None:
+        # Runs in a thread: Queue.get blocks, the event loop must not.
+        while True:
+            message = self._results.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_result, *message)
+
+    def _on_result(self, kind: str, shard: int, body: Any) -> None:
+        self._workers[shard].last_seen = time.monotonic()
+        if kind == "sent":
+            task_id, chat_id = body
+            pending = self._pending.get(task_id)
+            if pending is None or chat_id in pending.sent:
+                return
+            pending.sent.add(chat_id)
+            if pending.on_sent is not None:
+                try:
+                    pending.on_sent(chat_id)
+                except Exception:
+                    logger.exception("on_sent callback failed for user %s", chat_id)
+        elif kind == "done":
+            task_id, stats, send_seconds = body
+            SEND_SECONDS.merge(send_seconds)
+            pending = self._pending.pop(task_id, None)
+            if pending is None:
+                return  # answered by a worker that was already replaced
+            result = DeliveryStats(**stats)
+            # Chats a replaced worker had already reached were not re-queued.
+            result.sent += pending.total - result.total
+            result.total = pending.total
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    async def _restart(self, shard: int, reason: str) -> None:
+        old = self._workers[shard]
+        logger.warning("Delivery shard %d %s; restarting it.", shard, reason)
+        if old.process.is_alive():
+            old.process.kill()
+        await asyncio.to_thread(old.process.join, 5)
+        old.tasks.cancel_join_thread()
+        worker = self._spawn(shard)
+        worker.restarts = old.restarts + 1
+        self._workers[shard] = worker
+        for pending in self._pending.values():
+            if pending.shard == shard:
+                task_id, chat_ids, text, send_kwargs = pending.task
+                pending.task = (task_id, [c for c in chat_ids if c not in pending.sent], text, send_kwargs)
+                worker.tasks.put(pending.task)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            now = time.monotonic()
+            for shard, worker in enumerate(self._workers):
+                if not worker.process.is_alive():
+                    await self._restart(shard, f"exited with code {worker.process.exitcode}")
+                elif now - worker.last_seen > self._heartbeat_timeout:
+                    await self._restart(shard, "stopped sending heartbeats")
+
+    # ── public API ─────────────────────────────────────────────────────────────
+
+    def start(self, token: str) -> None:
+        """Spawn the workers. Called once in post_init."""
+        self._token = token
+        self._loop = asyncio.get_running_loop()
+        self._results = self._ctx.Queue()
+        self._workers = [self._spawn(shard) for shard in range(self._shards)]
+        self._reader = threading.Thread(target=self._read_results, name="shard-results", daemon=True)
+        self._reader.start()
+        self._monitor = self._loop.create_task(self._watch())
+
+    def shard_of(self, chat_id: int) -> int:
+        return chat_id % self._shards
+
+    async def deliver(
+        self,
+        bot: Bot,
+        chat_ids: Iterable[int],
+        text: str,
+        on_sent: Optional[OnSent] = None,
+        observe: bool = True,
+        **send_kwargs: Any,
+    ) -> DeliveryStats:
+        """Same contract as :meth:`DeliveryEngine.deliver`; *bot* is unused, workers have their own.
+
+        Raises ``RuntimeError`` once :meth:`stop` has begun: the workers may
+        already be gone, and the fan-out would wait for them forever.
+        """
+        if self._stopping:
+            raise RuntimeError("Delivery shards are shutting down")
+        buckets: List[List[int]] = [[] for _ in range(self._shards)]
+        for chat_id in chat_ids:
+            buckets[self.shard_of(chat_id)].append(chat_id)
+
+        futures = []
+        for shard, bucket in enumerate(buckets):
+            if not bucket:
+                continue
+            task: ShardTask = (next(self._task_ids), bucket, text, send_kwargs)
+            future = self._loop.create_future()
+            self._pending[task[0]] = _Pending(shard, task, future, on_sent, total=len(bucket))
+            self._workers[shard].tasks.put(task)
+            futures.append(future)
+
+        stats = DeliveryStats()
+        for shard_stats in await asyncio.gather(*futures):
+            stats.merge(shard_stats)
+        if observe:
+            observe_fanout(stats)
+        return stats
+
+    def health(self) -> List[Tuple[int, Optional[int], bool, int]]:
+        """(shard, pid, alive, restarts) of every worker."""
+        return [
+            (shard, w.process.pid, w.process.is_alive(), w.restarts)
+            for shard, w in enumerate(self._workers)
+        ]
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Let workers finish their tasks, then join them."""
+        if self._monitor is None:
+            return
+        self._stopping = True
+        self._monitor.cancel()
+        for worker in self._workers:
+            worker.tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            remaining = max(0.0, deadline - time.monotonic())
+            await asyncio.to_thread(worker.process.join, remaining)
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._results.put(None)
+        await asyncio.to_thread(self._reader.join)
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.cancel()
+        self._pending.clear()
+        self._monitor = None
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import list_db
+from di import occurrences
+from models import TimeSlot
+from occurrences import OccurrenceIndex
+from outbox import Outbox, outbox
+
+logger = logging.getLogger(__name__)
+
+# Staged batches whose fire is this late are given up on; a fire that still
+# comes after that takes the regular path. Covers the 300 s misfire grace.
+_EXPIRE_AFTER = timedelta(minutes=10)
+
+ORDERS = ("telegram_id", "earliest")
+
+
+def recipient_order(order: str, vips: FrozenSet[int] = frozenset()) -> Callable[[Sequence[int]], Sequence[int]]:
+    """Release order for a fan-out: ``telegram_id`` keeps the index order, ``earliest``
+    puts the longest-registered users first. *vips* go ahead of everyone either way.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown delivery order {order!r}, expected one of {ORDERS}")
+
+    def arrange(ids: Sequence[int]) -> Sequence[int]:
+        if order == "earliest":
+            ids = sorted(ids, key=lambda tid: list_db.users.id_of(tid) or sys.maxsize)
+        if vips:
+            ids = [tid for tid in ids if tid in vips] + [tid for tid in ids if tid not in vips]
+        return ids if isinstance(ids, array) else array("q", ids)
+
+    return arrange
+
+
+class Stager:
+    """Prepares upcoming fires before they are due.
+
+    Every *interval* seconds, each occurrence due within *lookahead* gets its
+    outbox batch written (:meth:`Outbox.stage`): the subscriber snapshot is
+    taken, put in release order and persisted while nothing is firing, so
+    the fire itself only has to flip the batch to pending and start sending.
+    Works off the :class:`OccurrenceIndex` shared with the trigger engine,
+    whichever engine that is.
+    """
+
+    def __init__(
+        self,
+        box: Outbox,
+        index: OccurrenceIndex,
+        order: Callable[[Sequence[int]], Sequence[int]],
+        lookahead: float = 60.0,
+        interval: float = 10.0,
+    ) -> None:
+        self._outbox = box
+        self._index = index
+        self._order = order
+        self._lookahead = timedelta(seconds=lookahead)
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def stage_due(self, now: Optional[datetime] = None) -> int:
+        """Stage every occurrence in ``(now, now + lookahead]``. Returns how many were new."""
+        now = now or datetime.now()
+        await self._outbox.expire(now - _EXPIRE_AFTER)
+        due: Dict[Tuple[int, datetime], List[TimeSlot]] = {}
+        for occurrence in self._index.next_fires(self._lookahead, now):
+            due.setdefault((occurrence.event_id, occurrence.at), []).append(occurrence.slot)
+        staged = 0
+        for (event_id, at), slots in due.items():
+            event = list_db.get_event(event_id)
+            if event is None:
+                continue
+            if await self._outbox.stage(event, slots, at, self._order):
+                staged += 1
+        return staged
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                staged = await self.stage_due()
+                if staged:
+                    logger.info("Staged %d upcoming batch(es).", staged)
+            except Exception:
+                logger.exception("Staging upcoming batches failed.")
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        """Start the look-ahead loop. A non-positive lookahead disables staging."""
+        if self._lookahead > timedelta(0) and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Chats served first in every fan-out, e.g. "12345,67890".
+VIP_IDS: FrozenSet[int] = frozenset(int(v) for v in os.getenv("VIP_IDS", "").split(",") if v.strip())
+
+stager = Stager(
+    outbox,
+    occurrences,
+    recipient_order(os.getenv("DELIVERY_ORDER", "telegram_id"), VIP_IDS),
+    lookahead=float(os.getenv("STAGE_LOOKAHEAD", "60")),
+    interval=float(os.getenv("STAGE_INTERVAL", "10")),
+)
@@ -0,0 +1,332 @@
+import asyncio
+import sqlite3
+import threading
+from dataclasses import replace
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from models import BroadcastJob, OutboxBatch, User
+from storage_abs import StorageAbs, StorageOp
+
+
+class MemoryStorage(StorageAbs):
+    """Volatile backend: keeps state for the lifetime of the process only."""
+
+    def __init__(self) -> None:
+        self._users: Dict[int, User] = {}
+        self._subscriptions: Set[Tuple[int, int]] = set()
+        self._inactive: Dict[int, float] = {}
+        self._digest_opt_outs: Set[int] = set()
+        self._broadcasts: Dict[int, BroadcastJob] = {}
+        self._broadcast_delivered: Set[Tuple[int, int]] = set()
+        self._outbox: Dict[str, OutboxBatch] = {}
+        self._outbox_recipients: Dict[str, Set[int]] = {}
+        self._last_fire: Optional[str] = None
+
+    async def open(self) -> None:
+        pass
+
+    async def load_users(self) -> List[User]:
+        return sorted(self._users.values(), key=lambda u: u.id)
+
+    async def load_subscriptions(self) -> List[Tuple[int, int]]:
+        return list(self._subscriptions)
+
+    async def load_inactive(self) -> List[int]:
+        return list(self._inactive)
+
+    async def load_digest_opt_outs(self) -> List[int]:
+        return list(self._digest_opt_outs)
+
+    async def load_broadcasts(self) -> List[BroadcastJob]:
+        return [replace(j) for _, j in sorted(self._broadcasts.items())]
+
+    async def load_broadcast_delivered(self) -> List[Tuple[int, int]]:
+        return sorted(self._broadcast_delivered)
+
+    async def load_outbox(self) -> List[Tuple[OutboxBatch, List[int]]]:
+        return [
+            (replace(b), sorted(self._outbox_recipients.get(b.id, ())))
+            for b in self._outbox.values()
+            if b.status == "pending"
+        ]
+
+    async def outbox_status(self, batch_id: str) -> Optional[str]:
+        batch = self._outbox.get(batch_id)
+        return batch.status if batch is not None else None
+
+    async def load_last_fire(self) -> Optional[datetime]:
+        return datetime.fromisoformat(self._last_fire) if self._last_fire else None
+
+    async def apply(self, ops: List[StorageOp]) -> None:
+        for kind, params in ops:
+            if kind == "add_user":
+                user_id, telegram_id = params
+                self._users[telegram_id] = User(id=user_id, telegram_id=telegram_id)
+            elif kind == "subscribe":
+                self._subscriptions.add(params)
+            elif kind == "unsubscribe":
+                self._subscriptions.discard(params)
+            elif kind == "unsubscribe_all":
+                (telegram_id,) = params
+                self._subscriptions = {s for s in self._subscriptions if s[1] != telegram_id}
+            elif kind == "deactivate":
+                telegram_id, since = params
+                self._inactive.setdefault(telegram_id, since)
+            elif kind == "reactivate":
+                self._inactive.pop(params[0], None)
+            elif kind == "digest_off":
+                self._digest_opt_outs.add(params[0])
+            elif kind == "digest_on":
+                self._digest_opt_outs.discard(params[0])
+            elif kind == "save_broadcast":
+                self._broadcasts[params[0]] = BroadcastJob(*params)
+            elif kind == "broadcast_delivered":
+                self._broadcast_delivered.add(params)
+            elif kind == "broadcast_clear":
+                (job_id,) = params
+                self._broadcast_delivered = {d for d in self._broadcast_delivered if d[0] != job_id}
+            elif kind == "outbox_add":
+                self._outbox.setdefault(params[0], OutboxBatch(*params))
+            elif kind == "outbox_recipient":
+                batch_id, telegram_id = params
+                self._outbox_recipients.setdefault(batch_id, set()).add(telegram_id)
+            elif kind == "outbox_delivered":
+                batch_id, telegram_id = params
+                self._outbox_recipients.get(batch_id, set()).discard(telegram_id)
+            elif kind == "outbox_clear":
+                self._outbox_recipients.pop(params[0], None)
+            elif kind == "outbox_done":
+                finished_at, batch_id = params
+                if batch_id in self._outbox:
+                    self._outbox[batch_id].status = "done"
+                    self._outbox[batch_id].finished_at = finished_at
+            elif kind == "outbox_prune":
+                (finished_before,) = params
+                for batch_id, b in list(self._outbox.items()):
+                    if b.status == "done" and b.finished_at < finished_before:
+                        del self._outbox[batch_id]
+            elif kind == "outbox_release":
+                b = self._outbox.get(params[0])
+                if b is not None and b.status == "staged":
+                    b.status = "pending"
+            elif kind == "outbox_drop":
+                b = self._outbox.get(params[0])
+                if b is not None and b.status == "staged":
+                    del self._outbox[b.id]
+            elif kind == "outbox_clear_staged":
+                for b in self._outbox.values():
+                    if b.status == "staged":
+                        self._outbox_recipients.pop(b.id, None)
+            elif kind == "outbox_drop_staged":
+                self._outbox = {k: b for k, b in self._outbox.items() if b.status != "staged"}
+            elif kind == "mark_fired":
+                self._last_fire = max(self._last_fire or "", params[0])
+            else:
+                raise ValueError(f"Unknown storage op: {kind!r}")
+
+    async def close(self) -> None:
+        pass
+
+
+# ── SQLite ─────────────────────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id          INTEGER PRIMARY KEY,
+    telegram_id INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    event_id    INTEGER NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    PRIMARY KEY (event_id, telegram_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subscriptions_by_user ON subscriptions (telegram_id);
+CREATE TABLE IF NOT EXISTS inactive_users (
+    telegram_id INTEGER PRIMARY KEY,
+    since       REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS digest_opt_outs (
+    telegram_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id             INTEGER PRIMARY KEY,
+    text           TEXT    NOT NULL,
+    target_user_id INTEGER NOT NULL,
+    total          INTEGER NOT NULL,
+    cursor         INTEGER NOT NULL,
+    sent           INTEGER NOT NULL,
+    failed         INTEGER NOT NULL,
+    status         TEXT    NOT NULL,
+    started_at     REAL    NOT NULL,
+    finished_at    REAL
+);
+CREATE TABLE IF NOT EXISTS broadcast_delivered (
+    job_id      INTEGER NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    PRIMARY KEY (job_id, telegram_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS outbox (
+    id          TEXT PRIMARY KEY,
+    event_id    INTEGER NOT NULL,
+    text        TEXT    NOT NULL,
+    entities    TEXT    NOT NULL,
+    status      TEXT    NOT NULL,
+    created_at  REAL    NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS outbox_recipients (
+    batch_id    TEXT    NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    PRIMARY KEY (batch_id, telegram_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# One statement per op kind; consecutive ops of the same kind go through executemany.
+_OP_SQL: Dict[str, str] = {
+    "add_user": "INSERT OR IGNORE INTO users (id, telegram_id) VALUES (?, ?)",
+    "subscribe": "INSERT OR IGNORE INTO subscriptions (event_id, telegram_id) VALUES (?, ?)",
+    "unsubscribe": "DELETE FROM subscriptions WHERE event_id = ? AND telegram_id = ?",
+    "unsubscribe_all": "DELETE FROM subscriptions WHERE telegram_id = ?",
+    "deactivate": "INSERT OR IGNORE INTO inactive_users (telegram_id, since) VALUES (?, ?)",
+    "reactivate": "DELETE FROM inactive_users WHERE telegram_id = ?",
+    "digest_off": "INSERT OR IGNORE INTO digest_opt_outs (telegram_id) VALUES (?)",
+    "digest_on": "DELETE FROM digest_opt_outs WHERE telegram_id = ?",
+    "save_broadcast": "INSERT OR REPLACE INTO broadcasts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "broadcast_delivered": (
+        "INSERT OR IGNORE INTO broadcast_delivered (job_id, telegram_id) VALUES (?, ?)"
+    ),
+    "broadcast_clear": "DELETE FROM broadcast_delivered WHERE job_id = ?",
+    "outbox_add": "INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "outbox_recipient": "INSERT OR IGNORE INTO outbox_recipients (batch_id, telegram_id) VALUES (?, ?)",
+    "outbox_delivered": "DELETE FROM outbox_recipients WHERE batch_id = ? AND telegram_id = ?",
+    "outbox_clear": "DELETE FROM outbox_recipients WHERE batch_id = ?",
+    "outbox_done": "UPDATE outbox SET status = 'done', finished_at = ? WHERE id = ?",
+    "outbox_prune": "DELETE FROM outbox WHERE status = 'done' AND finished_at < ?",
+    "outbox_release": "UPDATE outbox SET status = 'pending' WHERE id = ? AND status = 'staged'",
+    "outbox_drop": "DELETE FROM outbox WHERE id = ? AND status = 'staged'",
+    "outbox_clear_staged": (
+        "DELETE FROM outbox_recipients"
+        " WHERE batch_id IN (SELECT id FROM outbox WHERE status = 'staged')"
+    ),
+    "outbox_drop_staged": "DELETE FROM outbox WHERE status = 'staged'",
+    "mark_fired": (
+        "INSERT INTO meta (key, value) VALUES ('last_fire', ?)"
+        " ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)"
+    ),
+}
+
+
+class SQLiteStorage(StorageAbs):
+    """SQLite backend in WAL mode.
+
+    All blocking calls run in a worker thread so the event-loop never waits on
+    disk. One connection is shared; a lock keeps transactions from the
+    write-behind flusher and direct checkpoint writes from interleaving.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _open_sync(self) -> None:
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def _query_sync(self, sql: str, params: Tuple[Any, ...] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _apply_sync(self, ops: List[StorageOp]) -> None:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                for kind, group in groupby(ops, key=lambda op: op[0]):
+                    sql = _OP_SQL.get(kind)
+                    if sql is None:
+                        raise ValueError(f"Unknown storage op: {kind!r}")
+                    conn.executemany(sql, [params for _, params in group])
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ── StorageAbs interface ───────────────────────────────────────────────────
+
+    async def open(self) -> None:
+        await asyncio.to_thread(self._open_sync)
+
+    async def load_users(self) -> List[User]:
+        rows = await asyncio.to_thread(
+            self._query_sync, "SELECT id, telegram_id FROM users ORDER BY id"
+        )
+        return [User(id=row[0], telegram_id=row[1]) for row in rows]
+
+    async def load_subscriptions(self) -> List[Tuple[int, int]]:
+        rows = await asyncio.to_thread(
+            self._query_sync, "SELECT event_id, telegram_id FROM subscriptions"
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    async def load_inactive(self) -> List[int]:
+        rows = await asyncio.to_thread(self._query_sync, "SELECT telegram_id FROM inactive_users")
+        return [row[0] for row in rows]
+
+    async def load_digest_opt_outs(self) -> List[int]:
+        rows = await asyncio.to_thread(self._query_sync, "SELECT telegram_id FROM digest_opt_outs")
+        return [row[0] for row in rows]
+
+    async def load_broadcasts(self) -> List[BroadcastJob]:
+        rows = await asyncio.to_thread(self._query_sync, "SELECT * FROM broadcasts ORDER BY id")
+        return [BroadcastJob(*row) for row in rows]
+
+    async def load_broadcast_delivered(self) -> List[Tuple[int, int]]:
+        rows = await asyncio.to_thread(
+            self._query_sync, "SELECT job_id, telegram_id FROM broadcast_delivered"
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    async def load_outbox(self) -> List[Tuple[OutboxBatch, List[int]]]:
+        batches = await asyncio.to_thread(
+            self._query_sync, "SELECT * FROM outbox WHERE status = 'pending'"
+        )
+        rows = await asyncio.to_thread(
+            self._query_sync,
+            "SELECT r.batch_id, r.telegram_id FROM outbox_recipients r"
+            " JOIN outbox o ON o.id = r.batch_id WHERE o.status = 'pending'"
+            " ORDER BY r.batch_id, r.telegram_id",
+        )
+        recipients: Dict[str, List[int]] = {}
+        for batch_id, telegram_id in rows:
+            recipients.setdefault(batch_id, []).append(telegram_id)
+        return [(OutboxBatch(*row), recipients.get(row[0], [])) for row in batches]
+
+    async def outbox_status(self, batch_id: str) -> Optional[str]:
+        rows = await asyncio.to_thread(
+            self._query_sync, "SELECT status FROM outbox WHERE id = ?", (batch_id,)
+        )
+        return rows[0][0] if rows else None
+
+    async def load_last_fire(self) -> Optional[datetime]:
+        rows = await asyncio.to_thread(
+            self._query_sync, "SELECT value FROM meta WHERE key = 'last_fire'"
+        )
+        return datetime.fromisoformat(rows[0][0]) if rows else None
+
+    async def apply(self, ops: List[StorageOp]) -> None:
+        await asyncio.to_thread(self._apply_sync, ops)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
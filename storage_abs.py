@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from models import BroadcastJob, OutboxBatch, User
+
+# A single queued mutation: (kind, params). *kind* names one of the
+# operations below, *params* are its positional arguments.
+#
+#   ("add_user",        (user_id, telegram_id))
+#   ("subscribe",       (event_id, telegram_id))
+#   ("unsubscribe",     (event_id, telegram_id))
+#   ("unsubscribe_all", (telegram_id,))
+#   ("save_broadcast",  (id, text, target_user_id, total, cursor, sent, failed,
+#                        status, started_at, finished_at))
+#   ("broadcast_delivered", (job_id, telegram_id))  sent past the job's cursor
+#   ("broadcast_clear",     (job_id,))              the cursor covers every delivered user
+#   ("outbox_add",       (id, event_id, text, entities, status, created_at, finished_at))
+#   ("outbox_recipient", (batch_id, telegram_id))   still to be sent
+#   ("outbox_delivered", (batch_id, telegram_id))   sent, drop from the batch
+#   ("outbox_clear",     (batch_id,))               drop every remaining recipient
+#   ("outbox_done",      (finished_at, batch_id))
+#   ("outbox_prune",     (finished_before,))        forget old finished batches
+#   ("outbox_release",   (batch_id,))               staged -> pending, the fire is due
+#   ("outbox_drop",      (batch_id,))               forget a staged batch (clear it first)
+#   ("outbox_clear_staged", ())                     drop the recipients of every staged batch
+#   ("outbox_drop_staged",  ())                     forget every staged batch
+#   ("mark_fired",       (fired_at,))               ISO "YYYY-MM-DDTHH:MM"; only moves forward
+#   ("deactivate",       (telegram_id, since))      permanent delivery failure
+#   ("reactivate",       (telegram_id,))            the user talked to the bot again
+#   ("digest_off",       (telegram_id,))            send this user every fire separately
+#   ("digest_on",        (telegram_id,))            back to the default: combine same-time fires
+StorageOp = Tuple[str, Tuple[Any, ...]]
+
+
+class StorageAbs(ABC):
+    """Abstract persistence backend for users and subscriptions.
+
+    The bot never reads from the backend while serving updates: everything is
+    loaded into ``list_db`` once at startup, and mutations reach the backend
+    in batches through :class:`write_behind.WriteBehindQueue`.
+    """
+
+    @abstractmethod
+    async def open(self) -> None:
+        """Prepare the backend (create files / schema). Called once in post_init."""
+        ...
+
+    @abstractmethod
+    async def load_users(self) -> List[User]:
+        """Return every stored user, ordered by ``User.id``."""
+        ...
+
+    @abstractmethod
+    async def load_subscriptions(self) -> List[Tuple[int, int]]:
+        """Return every stored ``(event_id, telegram_id)`` pair."""
+        ...
+
+    @abstractmethod
+    async def load_inactive(self) -> List[int]:
+        """Return the telegram ids of every user marked inactive by ``deactivate``."""
+        ...
+
+    @abstractmethod
+    async def load_digest_opt_outs(self) -> List[int]:
+        """Return the telegram ids of every user who turned digests off."""
+        ...
+
+    @abstractmethod
+    async def load_broadcasts(self) -> List[BroadcastJob]:
+        """Return every stored broadcast job, ordered by ``BroadcastJob.id``."""
+        ...
+
+    @abstractmethod
+    async def load_broadcast_delivered(self) -> List[Tuple[int, int]]:
+        """Return ``(job_id, telegram_id)`` for users reached past their job's cursor."""
+        ...
+
+    @abstractmethod
+    async def load_outbox(self) -> List[Tuple[OutboxBatch, List[int]]]:
+        """Return every pending outbox batch with the recipients it has not reached yet."""
+        ...
+
+    @abstractmethod
+    async def outbox_status(self, batch_id: str) -> Optional[str]:
+        """Return the status of outbox batch *batch_id*, or ``None`` if it is not stored."""
+        ...
+
+    @abstractmethod
+    async def load_last_fire(self) -> Optional[datetime]:
+        """Return the latest scheduled fire time recorded by ``mark_fired``, if any."""
+        ...
+
+    @abstractmethod
+    async def apply(self, ops: List[StorageOp]) -> None:
+        """Apply *ops* in order as a single transaction."""
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release any resources held by the backend."""
+        ...
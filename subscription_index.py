@@ -0,0 +1,191 @@
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+_EMPTY = b""
+
+# (telegram_id, joined) entries recorded for a watched event, oldest first.
+ChangeLog = List[Tuple[int, bool]]
+
+
+def _unpack(packed: bytes) -> array:
+    return array("q", packed)
+
+
+def _remove(values: array, value: int) -> bool:
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
+        return True
+    return False
+
+
+class SubscriptionIndex:
+    """Bidirectional event ↔ subscriber index, packed for millions of users.
+
+    Keeps ``event_id → telegram ids`` as a sorted ``array('q')`` (8 bytes per
+    subscription) and ``telegram_id → event ids`` as the sorted ids packed
+    into one immutable ``bytes`` object per user, in step. Subscribe and
+    unsubscribe are a binary search plus a move of the array's tail; listing
+    a single user's subscriptions is O(k) in the number of events they follow.
+    The arrays hold telegram ids rather than dense registry ids: fan-out,
+    staging and the outbox all work in telegram ids, and this way no send
+    has to translate its recipient through the registry first.
+
+    A user's packed ids double as their subscription version: caches of
+    per-user views (keyboards, pages) key on it, so it changes whenever the
+    subscriptions do.
+
+    Inactive users (blocked the bot, deleted their account) keep their
+    entries in ``telegram_id → event ids`` but are left out of the per-event
+    fan-out arrays until they are reactivated.
+
+    :meth:`watch` records every change to one event's fan-out from then on,
+    so a snapshot taken ahead of time can be brought up to date cheaply.
+    """
+
+    def __init__(self) -> None:
+        self._by_event: Dict[int, array] = {}
+        self._by_user: Dict[int, bytes] = {}
+        self._inactive: Set[int] = set()
+        self._inactive_by_event: Dict[int, int] = {}
+        self._watchers: Dict[int, List[ChangeLog]] = {}
+
+    def _note(self, event_id: int, telegram_id: int, joined: bool) -> None:
+        for log in self._watchers.get(event_id, ()):
+            log.append((telegram_id, joined))
+
+    # ── mutations ──────────────────────────────────────────────────────────────
+
+    def load(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """Replace the contents with ``(event_id, telegram_id)`` *pairs*, sorting once."""
+        by_event: Dict[int, List[int]] = {}
+        by_user: Dict[int, List[int]] = {}
+        for event_id, telegram_id in pairs:
+            by_event.setdefault(event_id, []).append(telegram_id)
+            by_user.setdefault(telegram_id, []).append(event_id)
+        self._by_event = {e: array("q", sorted(set(ids))) for e, ids in by_event.items()}
+        self._by_user = {t: array("q", sorted(set(ids))).tobytes() for t, ids in by_user.items()}
+        self._inactive = set()
+        self._inactive_by_event = {}
+
+    def subscribe(self, event_id: int, telegram_id: int) -> bool:
+        """Add a subscription. Returns ``False`` if it already existed."""
+        user_events = _unpack(self._by_user.get(telegram_id, _EMPTY))
+        i = bisect_left(user_events, event_id)
+        if i < len(user_events) and user_events[i] == event_id:
+            return False
+        user_events.insert(i, event_id)
+        self._by_user[telegram_id] = user_events.tobytes()
+        if telegram_id in self._inactive:
+            self._inactive_by_event[event_id] = self._inactive_by_event.get(event_id, 0) + 1
+        else:
+            insort(self._by_event.setdefault(event_id, array("q")), telegram_id)
+            self._note(event_id, telegram_id, True)
+        return True
+
+    def unsubscribe(self, event_id: int, telegram_id: int) -> bool:
+        """Remove a subscription. Returns ``False`` if there was none."""
+        user_events = _unpack(self._by_user.get(telegram_id, _EMPTY))
+        if not _remove(user_events, event_id):
+            return False
+        if user_events:
+            self._by_user[telegram_id] = user_events.tobytes()
+        else:
+            del self._by_user[telegram_id]
+        self._drop(event_id, telegram_id)
+        return True
+
+    def unsubscribe_all(self, telegram_id: int) -> List[int]:
+        """Drop every subscription of *telegram_id* and return the affected event ids."""
+        event_ids = _unpack(self._by_user.pop(telegram_id, _EMPTY)).tolist()
+        for event_id in event_ids:
+            self._drop(event_id, telegram_id)
+        return event_ids
+
+    def deactivate(self, telegram_ids: Iterable[int]) -> List[int]:
+        """Take users out of every fan-out array. Returns the ids that were active until now."""
+        changed = []
+        for telegram_id in telegram_ids:
+            if telegram_id in self._inactive:
+                continue
+            self._inactive.add(telegram_id)
+            for event_id in self.events_of(telegram_id):
+                _remove(self._by_event[event_id], telegram_id)
+                self._inactive_by_event[event_id] = self._inactive_by_event.get(event_id, 0) + 1
+                self._note(event_id, telegram_id, False)
+            changed.append(telegram_id)
+        return changed
+
+    def reactivate(self, telegram_id: int) -> bool:
+        """Put an inactive user's subscriptions back into the fan-out arrays."""
+        if telegram_id not in self._inactive:
+            return False
+        self._inactive.discard(telegram_id)
+        for event_id in self.events_of(telegram_id):
+            insort(self._by_event.setdefault(event_id, array("q")), telegram_id)
+            self._inactive_by_event[event_id] -= 1
+            self._note(event_id, telegram_id, True)
+        return True
+
+    def _drop(self, event_id: int, telegram_id: int) -> None:
+        if telegram_id in self._inactive:
+            self._inactive_by_event[event_id] -= 1
+        else:
+            _remove(self._by_event[event_id], telegram_id)
+            self._note(event_id, telegram_id, False)
+
+    # ── change tracking ────────────────────────────────────────────────────────
+
+    def watch(self, event_id: int) -> ChangeLog:
+        """Start recording who joins or leaves *event_id*'s fan-out; returns the log."""
+        log: ChangeLog = []
+        self._watchers.setdefault(event_id, []).append(log)
+        return log
+
+    def unwatch(self, event_id: int, log: ChangeLog) -> None:
+        logs = [entry for entry in self._watchers.get(event_id, ()) if entry is not log]
+        if logs:
+            self._watchers[event_id] = logs
+        else:
+            self._watchers.pop(event_id, None)
+
+    # ── queries ────────────────────────────────────────────────────────────────
+
+    def version(self, telegram_id: int) -> bytes:
+        """Token that changes whenever *telegram_id*'s subscriptions do."""
+        return self._by_user.get(telegram_id, _EMPTY)
+
+    def is_subscribed(self, event_id: int, telegram_id: int) -> bool:
+        user_events = self.events_of(telegram_id)
+        i = bisect_left(user_events, event_id)
+        return i < len(user_events) and user_events[i] == event_id
+
+    def events_of(self, telegram_id: int) -> Sequence[int]:
+        """Event ids *telegram_id* is subscribed to, sorted."""
+        return _unpack(self._by_user.get(telegram_id, _EMPTY))
+
+    def subscribers(self, event_id: int) -> Sequence[int]:
+        """Snapshot of the active subscribers of *event_id*, safe to iterate across awaits."""
+        return self._by_event.get(event_id, array("q"))[:]
+
+    def subscribers_page(self, event_id: int, offset: int, limit: int) -> List[int]:
+        """Up to *limit* subscribers of *event_id* starting at *offset*, in telegram id order."""
+        return self._by_event.get(event_id, array("q"))[offset:offset + limit].tolist()
+
+    def is_active(self, telegram_id: int) -> bool:
+        return telegram_id not in self._inactive
+
+    def inactive_count(self) -> int:
+        return len(self._inactive)
+
+    def inactive_subscriber_count(self, event_id: int) -> int:
+        """Subscribers of *event_id* currently left out of its fan-out."""
+        return self._inactive_by_event.get(event_id, 0)
+
+    def count(self) -> int:
+        """Total number of (event, user) subscriptions of active users."""
+        return sum(len(s) for s in self._by_event.values())
+
+    def subscriber_count(self, event_id: int) -> int:
+        return len(self._by_event.get(event_id, ()))
@@ -1,11 +1,13 @@
-from datetime import datetime
-from typing import Callable, Coroutine, Any, List, Union
+from datetime import datetime, time, timedelta
+from typing import Callable, Coroutine, Any, Dict, List, Set, Union
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from models import Event, TimeSlot, WeekSchedule
-from time_trigger_abs import TimeTriggerAbs, TriggerCallback
+from occurrences import OccurrenceIndex
+from payloads import PayloadCache
+from time_trigger_abs import TimeTriggerAbs, TriggerCallback, pair_triggers
 
 # Maps Python dataclass field names → APScheduler day-of-week abbreviations
 _DAY_FIELD_TO_CRON: dict[str, str] = {
@@ -18,10 +20,22 @@ _DAY_FIELD_TO_CRON: dict[str, str] = {
     "sunday": "sun",
 }
 
+# Odd ISO-week numbers are treated as 'top', even as 'bottom' (see occurrences.is_top_week).
+_WEEK_PARITY_TO_CRON: dict[str, str] = {
+    "top": "1-53/2",
+    "bottom": "2-53/2",
+}
+
 
-def _is_top_week() -> bool:
-    """Odd ISO-week numbers are treated as 'top', even as 'bottom'."""
-    return datetime.now().isocalendar()[1] % 2 != 0
+def _last_run(at: time) -> datetime:
+    """The latest datetime at or before now with the time of day *at*.
+
+    A daily cron job only runs at its own minute, give or take the misfire
+    grace, so this is the run it was scheduled for even past midnight.
+    """
+    now = datetime.now()
+    run = datetime.combine(now.date(), at)
+    return run if run <= now else run - timedelta(days=1)
 
 
 def _build_job_id(event_id: str, week_type: str, day: str, time_str: str) -> str:
@@ -33,10 +47,19 @@ class APSchedulerTimeTrigger(TimeTriggerAbs):
 
     Call :meth:`start` once the asyncio event-loop is running (e.g. inside
     Application.post_init).
+
+    Week parity and the event's date range are part of each cron trigger, so
+    jobs only wake up for real occurrences. *occurrences* is kept in sync with
+    the registered events for callers that list upcoming fires, and every
+    event's messages are compiled into *payloads* when it is registered.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, occurrences: OccurrenceIndex, payloads: PayloadCache) -> None:
         self._scheduler: AsyncIOScheduler = AsyncIOScheduler()
+        # Job ids per event, so removing one event doesn't scan every job.
+        self._job_ids: Dict[Union[int, str], Set[str]] = {}
+        self._occurrences = occurrences
+        self._payloads = payloads
 
     def start(self) -> None:
         if not self._scheduler.running:
@@ -53,25 +76,34 @@ class APSchedulerTimeTrigger(TimeTriggerAbs):
         func: TriggerCallback,
     ) -> None:
         hour, minute = map(int, slot.time.split(":"))
-        is_top = week_type == "top"
         job_id = _build_job_id(event.id, week_type, day_name, slot.time)
 
         # Capture loop variables via default arguments to avoid closure issues
         async def _job(
             _event: Event = event,
             _slot: TimeSlot = slot,
-            _top: bool = is_top,
             _func: TriggerCallback = func,
         ) -> None:
-            if _is_top_week() == _top:
-                await _func(_event, _slot)
+            await _func(_event, _slot, _last_run(time(hour, minute)))
 
         self._scheduler.add_job(
             _job,
-            CronTrigger(day_of_week=_DAY_FIELD_TO_CRON[day_name], hour=hour, minute=minute),
+            CronTrigger(
+                week=_WEEK_PARITY_TO_CRON[week_type],
+                day_of_week=_DAY_FIELD_TO_CRON[day_name],
+                hour=hour,
+                minute=minute,
+                start_date=datetime.combine(event.from_date, time.min),
+                end_date=datetime.combine(event.till_date, time.max),
+            ),
             id=job_id,
             replace_existing=True,
+            # A busy loop may start a job a little late; still run it (once).
+            # Fires missed while the bot was down are handled by catch_up.
+            misfire_grace_time=300,
+            coalesce=True,
         )
+        self._job_ids.setdefault(event.id, set()).add(job_id)
 
     def _schedule_week(
         self, event: Event, week_type: str, week: WeekSchedule, func: TriggerCallback
@@ -83,30 +115,32 @@ class APSchedulerTimeTrigger(TimeTriggerAbs):
     # ── TimeTriggerAbs interface ───────────────────────────────────────────────
 
     async def add_trigger(self, event: Event, func_to_trigger: TriggerCallback) -> None:
+        # Drop the previous version's jobs first: its slots or dates may have changed.
+        await self.remove_trigger(event.id)
+        if event.till_date < datetime.now().date():
+            return
+        self._payloads.compile_event(event)
+        self._occurrences.update(event)
         self._schedule_week(event, "top", event.top_week, func_to_trigger)
         self._schedule_week(event, "bottom", event.bottom_week, func_to_trigger)
 
     async def remove_trigger(self, event_id: str) -> None:
-        for job in self._scheduler.get_jobs():
-            if job.id.startswith(f"{event_id}__"):
-                self._scheduler.remove_job(job.id)
+        self._occurrences.discard(event_id)
+        self._payloads.discard(event_id)
+        for job_id in self._job_ids.pop(event_id, ()):
+            if self._scheduler.get_job(job_id) is not None:
+                self._scheduler.remove_job(job_id)
 
     async def import_triggers(
         self,
         events: List[Event],
         funcs_to_trigger: Union[TriggerCallback, List[TriggerCallback]],
     ) -> None:
-        if callable(funcs_to_trigger):
-            for event in events:
-                await self.add_trigger(event, funcs_to_trigger)
-        else:
-            if len(events) != len(funcs_to_trigger):
-                raise ValueError(
-                    f"events ({len(events)}) and funcs_to_trigger ({len(funcs_to_trigger)}) "
-                    "must have the same length."
-                )
-            for event, func in zip(events, funcs_to_trigger):
-                await self.add_trigger(event, func)
+        for event, func in pair_triggers(events, funcs_to_trigger):
+            await self.add_trigger(event, func)
 
     async def remove_all_triggers(self) -> None:
         self._scheduler.remove_all_jobs()
+        self._job_ids.clear()
+        self._occurrences.clear()
+        self._payloads.clear()
@@ -1,10 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Coroutine, Any, List, Union
+from datetime import datetime
+from typing import Callable, Coroutine, Any, List, Tuple, Union
 
 from models import Event, TimeSlot
 
-# Type alias for the trigger callback signature
-TriggerCallback = Callable[[Event, TimeSlot], Coroutine[Any, Any, None]]
+# Type alias for the trigger callback signature: (event, slot, scheduled fire time)
+TriggerCallback = Callable[[Event, TimeSlot, datetime], Coroutine[Any, Any, None]]
+
+
+def pair_triggers(
+    events: List[Event],
+    funcs_to_trigger: Union[TriggerCallback, List[TriggerCallback]],
+) -> List[Tuple[Event, TriggerCallback]]:
+    """Resolve the *funcs_to_trigger* argument of :meth:`TimeTriggerAbs.import_triggers`."""
+    if callable(funcs_to_trigger):
+        return [(event, funcs_to_trigger) for event in events]
+    if len(events) != len(funcs_to_trigger):
+        raise ValueError(
+            f"events ({len(events)}) and funcs_to_trigger ({len(funcs_to_trigger)}) "
+            "must have the same length."
+        )
+    return list(zip(events, funcs_to_trigger))
 
 
 class TimeTriggerAbs(ABC):
@@ -12,9 +28,16 @@ class TimeTriggerAbs(ABC):
 
     Each *trigger* corresponds to a single Event's schedule.
     When a scheduled time arrives the registered callback is invoked
-    with the relevant Event and TimeSlot.
+    with the relevant Event and TimeSlot, and the time the slot was
+    scheduled for (not when the callback happens to run).
     """
 
+    def start(self) -> None:
+        """Start firing. Called once the asyncio event-loop is running.
+
+        Engines that need no explicit start may keep this no-op.
+        """
+
     @abstractmethod
     async def add_trigger(
         self,
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from models import Event
+from occurrences import Occurrence, OccurrenceIndex
+from payloads import PayloadCache
+from time_trigger_abs import TimeTriggerAbs, TriggerCallback, pair_triggers
+
+logger = logging.getLogger(__name__)
+
+# Never sleep longer than this in one go, so wall-clock jumps are noticed.
+_MAX_SLEEP = 60.0
+
+
+@dataclass(eq=False)
+class _Registration:
+    event: Event
+    func: TriggerCallback
+    alive: bool = True
+
+
+class HeapTimeTrigger(TimeTriggerAbs):
+    """Trigger engine that keeps every event on one min-heap timeline.
+
+    Each live event has exactly one heap entry: the batch of its occurrences
+    sharing the next fire time, taken from the :class:`OccurrenceIndex`. A
+    single asyncio timer is armed for the earliest entry. When it goes off,
+    everything due is fired in one wakeup and each event is re-pushed at its
+    next real occurrence, so week parity and the event's date range are
+    honoured without waking up for nothing. Removal is lazy: a removed
+    event's entry is flagged dead and skipped when it reaches the top.
+
+    Every event's messages are compiled into *payloads* when it is registered.
+    """
+
+    def __init__(self, occurrences: OccurrenceIndex, payloads: PayloadCache) -> None:
+        self._occurrences = occurrences
+        self._payloads = payloads
+        self._heap: List[Tuple[float, int, _Registration, List[Occurrence]]] = []
+        self._by_event: Dict[Union[int, str], _Registration] = {}
+        self._seq = 0
+        self._dead = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._running = True
+        self._arm()
+
+    # ── internal helpers ───────────────────────────────────────────────────────
+
+    def _push(self, reg: _Registration, after: datetime) -> bool:
+        batch = self._occurrences.next_batch(reg.event.id, after)
+        if not batch:
+            return False
+        self._seq += 1
+        heapq.heappush(self._heap, (batch[0].at.timestamp(), self._seq, reg, batch))
+        return True
+
+    def _arm(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._running or not self._heap:
+            return
+        delay = max(0.0, self._heap[0][0] - time.time())
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(min(delay, _MAX_SLEEP), self._wake)
+
+    def _wake(self) -> None:
+        self._timer = None
+        now = time.time()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, _, reg, batch = heapq.heappop(self._heap)
+            if not reg.alive:
+                self._dead -= 1
+                continue
+            for occurrence in batch:
+                task = asyncio.get_running_loop().create_task(reg.func(reg.event, occurrence.slot, occurrence.at))
+                self._tasks.add(task)
+                task.add_done_callback(self._on_done)
+                fired += 1
+            if not self._push(reg, batch[0].at):
+                # Past the event's till_date: nothing left to schedule.
+                self._by_event.pop(reg.event.id, None)
+        if fired:
+            logger.debug("Fired %d slot(s) in one wakeup.", fired)
+        self._arm()
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Trigger callback failed: %r", task.exception())
+
+    def _compact(self) -> None:
+        """Rebuild the heap without dead entries once they make up half of it."""
+        if self._dead * 2 > len(self._heap):
+            self._heap = [item for item in self._heap if item[2].alive]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    # ── TimeTriggerAbs interface ───────────────────────────────────────────────
+
+    async def add_trigger(self, event: Event, func_to_trigger: TriggerCallback) -> None:
+        await self.remove_trigger(event.id)
+        self._payloads.compile_event(event)
+        self._occurrences.update(event)
+        reg = _Registration(event, func_to_trigger)
+        if not self._push(reg, datetime.now()):
+            return
+        self._by_event[event.id] = reg
+        if self._running and self._heap[0][2] is reg:
+            self._arm()
+
+    async def remove_trigger(self, event_id: Union[int, str]) -> None:
+        self._occurrences.discard(event_id)
+        self._payloads.discard(event_id)
+        reg = self._by_event.pop(event_id, None)
+        if reg is not None:
+            reg.alive = False
+            self._dead += 1
+            self._compact()
+
+    async def import_triggers(
+        self,
+        events: List[Event],
+        funcs_to_trigger: Union[TriggerCallback, List[TriggerCallback]],
+    ) -> None:
+        for event, func in pair_triggers(events, funcs_to_trigger):
+            await self.add_trigger(event, func)
+
+    async def remove_all_triggers(self) -> None:
+        self._heap.clear()
+        self._by_event.clear()
+        self._occurrences.clear()
+        self._payloads.clear()
+        self._dead = 0
+        self._arm()
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _ordering_key(update: object) -> Optional[int]:
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different users in parallel, each user's in order.
+
+    Every user has a FIFO lock, so two clicks from the same user never
+    interleave, while clicks from other users proceed. At most
+    *max_concurrent_updates* handlers actually run at once. Updates waiting
+    on their user's lock only count against *max_pending_updates*, so one
+    user mashing a button cannot starve the rest.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int) -> None:
+        super().__init__(max_pending_updates)
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _ordering_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock, self._running:
+                await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -3,34 +3,37 @@ from telegram.ext import ContextTypes, CommandHandler
 from typing import List
 
 import list_db
+from di import occurrences
 from models import User, Event
 from keyboards import get_menu_keyboard
 
+SCHEDULE_SIZE = 10
+
 
 # ── helpers ────────────────────────────────────────────────────────────────────
 
 def get_or_create_user(telegram_id: int) -> User:
-    for u in list_db.users:
-        if u.telegram_id == telegram_id:
-            return u
-    user = User(id=len(list_db.users) + 1, telegram_id=telegram_id)
-    list_db.users.append(user)
-    return user
+    # Any contact proves the chat is reachable again.
+    list_db.reactivate(telegram_id)
+    user = list_db.get_user(telegram_id)
+    return user if user is not None else list_db.add_user(telegram_id)
 
 
 def get_subscribed_events(telegram_id: int) -> List[Event]:
-    return [e for e in list_db.events if telegram_id in e.subscriber_telegram_ids]
+    event_ids = list_db.subscriptions.events_of(telegram_id)
+    return [list_db.events_by_id[i] for i in event_ids if i in list_db.events_by_id]
 
 
 def get_available_events(telegram_id: int) -> List[Event]:
-    return [e for e in list_db.events if telegram_id not in e.subscriber_telegram_ids]
+    subscribed = set(list_db.subscriptions.events_of(telegram_id))
+    return [e for e in list_db.events if e.id not in subscribed]
 
 
 # ── command handlers ────────────────────────────────────────────────────────────
 
 async def cmd_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = get_or_create_user(update.effective_user.id)
-    has_subs = bool(get_subscribed_events(user.telegram_id))
+    has_subs = bool(list_db.subscriptions.events_of(user.telegram_id))
     await update.message.reply_text(
         "📋 *Main Menu*", parse_mode="Markdown",
         reply_markup=get_menu_keyboard(has_subs),
@@ -43,19 +46,18 @@ async def cmd_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
     event_id = context.args[0]
     user = get_or_create_user(update.effective_user.id)
-    for event in list_db.events:
-        if event.id == event_id:
-            if user.telegram_id not in event.subscriber_telegram_ids:
-                event.subscriber_telegram_ids.append(user.telegram_id)
-                await update.message.reply_text(
-                    f"✅ Subscribed to *{event.name}*", parse_mode="Markdown"
-                )
-            else:
-                await update.message.reply_text(
-                    f"ℹ️ Already subscribed to *{event.name}*", parse_mode="Markdown"
-                )
-            return
-    await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+    event = list_db.get_event(event_id)
+    if event is None:
+        await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+        return
+    if list_db.subscribe(event.id, user.telegram_id):
+        await update.message.reply_text(
+            f"✅ Subscribed to *{event.name}*", parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text(
+            f"ℹ️ Already subscribed to *{event.name}*", parse_mode="Markdown"
+        )
 
 
 async def cmd_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -64,28 +66,23 @@ async def cmd_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     event_id = context.args[0]
     user = get_or_create_user(update.effective_user.id)
-    for event in list_db.events:
-        if event.id == event_id:
-            if user.telegram_id in event.subscriber_telegram_ids:
-                event.subscriber_telegram_ids.remove(user.telegram_id)
-                await update.message.reply_text(
-                    f"✅ Unsubscribed from *{event.name}*", parse_mode="Markdown"
-                )
-            else:
-                await update.message.reply_text(
-                    f"ℹ️ Not subscribed to *{event.name}*", parse_mode="Markdown"
-                )
-            return
-    await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+    event = list_db.get_event(event_id)
+    if event is None:
+        await update.message.reply_text(f"❌ Event `{event_id}` not found.", parse_mode="Markdown")
+        return
+    if list_db.unsubscribe(event.id, user.telegram_id):
+        await update.message.reply_text(
+            f"✅ Unsubscribed from *{event.name}*", parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text(
+            f"ℹ️ Not subscribed to *{event.name}*", parse_mode="Markdown"
+        )
 
 
 async def cmd_unsubscribe_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = get_or_create_user(update.effective_user.id)
-    count = 0
-    for event in list_db.events:
-        if user.telegram_id in event.subscriber_telegram_ids:
-            event.subscriber_telegram_ids.remove(user.telegram_id)
-            count += 1
+    count = len(list_db.unsubscribe_all(user.telegram_id))
     msg = (
         f"✅ Unsubscribed from all *{count}* event(s)."
         if count else "ℹ️ You have no active subscriptions."
@@ -93,10 +90,52 @@ async def cmd_unsubscribe_all(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text(msg, parse_mode="Markdown")
 
 
+async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the next notifications for the user's subscriptions."""
+    user = get_or_create_user(update.effective_user.id)
+    events = get_subscribed_events(user.telegram_id)
+    if not events:
+        await update.message.reply_text("ℹ️ You have no active subscriptions.")
+        return
+    upcoming = sorted(
+        (o for e in events for o in occurrences.upcoming(e.id, SCHEDULE_SIZE)),
+        key=lambda o: o.at,
+    )[:SCHEDULE_SIZE]
+    if not upcoming:
+        await update.message.reply_text("ℹ️ No upcoming notifications.")
+        return
+    lines = ["🗓 *Upcoming notifications:*"] + [
+        f"• `{o.at:%a %d.%m %H:%M}` — {list_db.events_by_id[o.event_id].name}"
+        for o in upcoming
+    ]
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
+async def cmd_digest(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Turn combined messages for notifications due at the same time on or off."""
+    user = get_or_create_user(update.effective_user.id)
+    choice = context.args[0].lower() if context.args else ""
+    if choice not in ("on", "off"):
+        state = "on" if list_db.wants_digest(user.telegram_id) else "off"
+        await update.message.reply_text(
+            f"📬 Digests are *{state}*.\nUsage: /digest on|off", parse_mode="Markdown"
+        )
+        return
+    enabled = choice == "on"
+    changed = list_db.set_digest(user.telegram_id, enabled)
+    msg = (
+        "✅ Notifications due at the same time will arrive as one message."
+        if enabled else "✅ Every notification will arrive as its own message."
+    )
+    await update.message.reply_text(msg if changed else f"ℹ️ Digests are already {choice}.")
+
+
 def get_command_handlers() -> list:
     return [
         CommandHandler("menu", cmd_menu),
         CommandHandler("subscribe", cmd_subscribe),
         CommandHandler("unsubscribe", cmd_unsubscribe),
         CommandHandler("unsubscribe_all", cmd_unsubscribe_all),
+        CommandHandler("schedule", cmd_schedule),
+        CommandHandler("digest", cmd_digest),
     ]
@@ -0,0 +1,62 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from models import User
+
+
+class UserRegistry:
+    """Every registered user, stored as compactly as the lookups allow.
+
+    User ids are dense and start at 1, so the telegram id of user *N* sits at
+    index ``N - 1`` of a flat ``array('q')`` (8 bytes per user), and a dict
+    maps telegram ids back to user ids for O(1) lookups. :class:`User`
+    records are built on demand and not kept.
+    """
+
+    def __init__(self) -> None:
+        self._telegram_ids = array("q")
+        self._ids: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._telegram_ids)
+
+    def __iter__(self) -> Iterator[User]:
+        for index, telegram_id in enumerate(self._telegram_ids):
+            yield User(index + 1, telegram_id)
+
+    def get(self, telegram_id: int) -> Optional[User]:
+        user_id = self._ids.get(telegram_id)
+        return None if user_id is None else User(user_id, telegram_id)
+
+    def id_of(self, telegram_id: int) -> Optional[int]:
+        return self._ids.get(telegram_id)
+
+    def add(self, telegram_id: int) -> User:
+        """Register *telegram_id* under the next free id. The caller checks it is new."""
+        self._telegram_ids.append(telegram_id)
+        user_id = len(self._telegram_ids)
+        self._ids[telegram_id] = user_id
+        return User(user_id, telegram_id)
+
+    def after(self, user_id: int, limit: int) -> List[User]:
+        """Up to *limit* users with ``User.id > user_id``, in id order."""
+        return [
+            User(user_id + offset + 1, telegram_id)
+            for offset, telegram_id in enumerate(self._telegram_ids[user_id:user_id + limit])
+        ]
+
+    def load(self, users: Iterable[User]) -> None:
+        """Replace the contents with *users*, which must be in id order with ids 1..N."""
+        self._telegram_ids = array("q")
+        self._ids = {}
+        for user in users:
+            expected = len(self._telegram_ids) + 1
+            if user.id != expected:
+                raise ValueError(f"User ids must be dense: expected {expected}, got {user.id}")
+            self.add(user.telegram_id)
+
+    def truncate(self, size: int) -> None:
+        """Forget every user with ``User.id > size``."""
+        for telegram_id in self._telegram_ids[size:]:
+            del self._ids[telegram_id]
+        del self._telegram_ids[size:]
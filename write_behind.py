@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, List, Optional
+
+from storage_abs import StorageAbs, StorageOp
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Buffers storage mutations and flushes them in batched transactions.
+
+    :meth:`put` never blocks, so handlers only touch memory. A background task
+    drains the buffer every *flush_interval* seconds, or sooner once
+    *max_batch* ops are waiting. A failed batch is put back at the front and
+    retried on the next tick.
+    """
+
+    def __init__(
+        self,
+        storage: StorageAbs,
+        max_batch: int = 500,
+        flush_interval: float = 0.5,
+    ) -> None:
+        self._storage = storage
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._buffer: Deque[StorageOp] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def put(self, kind: str, *params: Any) -> None:
+        """Queue a mutation; see :data:`storage_abs.StorageOp` for the op kinds."""
+        self._buffer.append((kind, params))
+        if self._wakeup is not None and len(self._buffer) >= self._max_batch:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Spawn the flusher. Must be called with the event-loop running."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def flush(self) -> None:
+        """Write everything currently buffered."""
+        while self._buffer:
+            batch: List[StorageOp] = []
+            while self._buffer and len(batch) < self._max_batch:
+                batch.append(self._buffer.popleft())
+            try:
+                await self._storage.apply(batch)
+            except Exception:
+                self._buffer.extendleft(reversed(batch))
+                raise
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out whatever is left."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+            self._wakeup = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Write-behind flush failed, %d op(s) pending: %s", len(self._buffer), exc)